@@ -0,0 +1,422 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import socket
+import subprocess
+import threading
+
+from loguru import logger
+
+# adb server默认地址
+ADB_HOST = "127.0.0.1"
+ADB_PORT = 5037
+
+
+class AdbError(OSError):
+    """
+    adb server返回FAIL或连接异常。属于连接错误（OSError），不会被界面识别、步骤失败等ValueError的处理吞掉
+    """
+
+
+def recv_exact(sock, size):
+    """
+    从socket读取指定长度的数据
+
+    :param sock: socket
+    :param size: 字节数
+    :return: bytes
+    :raises AdbError: 连接提前关闭
+    """
+    data = bytearray(size)
+    recv_into_exact(sock, memoryview(data))
+    return bytes(data)
+
+
+def recv_into_exact(sock, view):
+    """
+    把数据直接读入已有的缓冲区，直到填满为止（不产生中间拷贝）
+
+    :param sock: socket
+    :param view: 可写的memoryview
+    :raises AdbError: 连接提前关闭
+    """
+    received = 0
+    size = len(view)
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise AdbError("adb连接已断开")
+        received += count
+
+
+class AdbClient(object):
+    """
+    adb server的socket客户端（smart socket协议），不需要每次启动adb进程
+    """
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT, timeout=10):
+        """
+        :param host: adb server地址，默认127.0.0.1
+        :param port: adb server端口，默认5037
+        :param timeout: socket超时时间（秒），默认10秒
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def connect(self):
+        """
+        :return: 连接到adb server的socket
+        :raises AdbError: adb server未启动
+        """
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise AdbError(f"无法连接adb server {self.host}:{self.port}: {e}")
+
+    @staticmethod
+    def send(sock, request):
+        """
+        发送请求并检查应答
+
+        :param sock: 已连接adb server的socket
+        :param request: 请求内容，例如host:devices
+        :raises AdbError: adb server返回FAIL
+        """
+        payload = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(f"adb请求失败({request}): {AdbClient.read_message(sock).decode('utf-8', 'replace')}")
+        raise AdbError(f"adb应答异常({request}): {status!r}")
+
+    @staticmethod
+    def read_message(sock):
+        """
+        读取带4位十六进制长度前缀的消息
+
+        :param sock: socket
+        :return: bytes
+        """
+        return recv_exact(sock, int(recv_exact(sock, 4), 16))
+
+    def query(self, request):
+        """
+        执行一次host服务请求并返回结果，例如host:version、host:devices
+
+        :param request: 请求内容
+        :return: 返回的消息（字符串）
+        """
+        with self.connect() as sock:
+            self.send(sock, request)
+            return self.read_message(sock).decode("utf-8")
+
+    def devices(self):
+        """
+        获取已连接的设备列表
+
+        :return: 设备列表，格式为[(设备ID, 设备状态), ...]
+        """
+        return parse_devices(self.query("host:devices"))
+
+    def open(self, serial, service):
+        """
+        连接到指定设备上的服务，返回的socket就是该服务的原始数据流
+
+        :param serial: 设备ID
+        :param service: 设备服务，例如exec:screencap、shell:input tap 1 1
+        :return: socket
+        """
+        sock = self.connect()
+        try:
+            self.send(sock, f"host:transport:{serial}")
+            self.send(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def exec_out(self, serial, command):
+        """
+        在设备上执行命令并读取全部输出（exec服务，不做换行转换）
+
+        :param serial: 设备ID
+        :param command: shell命令
+        :return: 命令输出（bytes）
+        """
+        chunks = list()
+        with self.open(serial, f"exec:{command}") as sock:
+            while True:
+                chunk = sock.recv(1 << 20)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+
+def parse_devices(text):
+    """
+    解析host:devices / adb devices的输出
+
+    :param text: 设备列表文本，每行为"设备ID\\t状态"
+    :return: 设备列表，格式为[(设备ID, 设备状态), ...]
+    """
+    devices = list()
+    for line in text.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[0].strip():
+            devices.append((parts[0].strip(), parts[1].strip()))
+    return devices
+
+
+def start_server():
+    """
+    启动本机的adb server（adb server未运行时使用，与adb devices自动启动server的行为一致）
+
+    :raises FileNotFoundError: 未安装adb
+    """
+    subprocess.run(["adb", "start-server"], capture_output=True, timeout=30)
+
+
+class AdbDevice(object):
+    """
+    单个设备的持久连接：按名称缓存打开的服务数据流，重复使用时不再重新建立连接
+    """
+
+    def __init__(self, client, serial):
+        """
+        :param client: AdbClient
+        :param serial: 设备ID
+        """
+        self.client = client
+        self.serial = serial
+        self._streams = dict()
+        self._lock = threading.Lock()
+
+    def stream(self, name, service):
+        """
+        获取持久的服务数据流，没有时建立连接
+
+        :param name: 数据流名称（同一设备上唯一）
+        :param service: 设备服务，例如exec:sh
+        :return: socket
+        """
+        with self._lock:
+            sock = self._streams.get(name)
+            if sock is None:
+                sock = self._streams[name] = self.client.open(self.serial, service)
+            return sock
+
+    def reset(self, name):
+        """
+        关闭指定的数据流（连接出错后调用，下次使用时重新建立）
+
+        :param name: 数据流名称
+        """
+        with self._lock:
+            sock = self._streams.pop(name, None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def shell(self, command):
+        """
+        执行一次shell命令并返回输出
+
+        :param command: shell命令
+        :return: 命令输出（字符串）
+        """
+        return self.client.exec_out(self.serial, command).decode("utf-8", "replace")
+
+    def close(self):
+        """
+        关闭该设备的所有数据流
+        """
+        with self._lock:
+            names = list(self._streams)
+        for name in names:
+            self.reset(name)
+
+
+class AdbPool(object):
+    """
+    adb连接池：通过socket直接与adb server通信，按设备保持持久连接，
+    后台监听host:track-devices，设备列表可以随时无阻塞地读取，设备变化时通知监听者
+    """
+
+    def __init__(self, client=None, retry_interval=2.0):
+        """
+        :param client: AdbClient，默认连接本机5037端口的adb server
+        :param retry_interval: 监听断开后重连的间隔（秒），默认2秒
+        """
+        self.client = client or AdbClient()
+        self.retry_interval = retry_interval
+        self._devices = None
+        self._connections = dict()
+        self._listeners = list()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._track_sock = None
+        self._server_started = False
+
+    def device(self, serial):
+        """
+        获取设备的持久连接
+
+        :param serial: 设备ID
+        :return: AdbDevice
+        """
+        with self._lock:
+            device = self._connections.get(serial)
+            if device is None:
+                device = self._connections[serial] = AdbDevice(self.client, serial)
+            return device
+
+    def devices(self):
+        """
+        获取设备列表。后台监听已启动时直接返回最近一次的结果，不访问adb server
+
+        :return: 设备列表，格式为[(设备ID, 设备状态), ...]
+        """
+        with self._lock:
+            if self._devices is not None:
+                return list(self._devices)
+        return self._query()
+
+    def online_devices(self):
+        """
+        :return: 正常连接（状态为device）的设备列表，格式为[(设备ID, 设备状态), ...]
+        """
+        return [device for device in self.devices() if device[1] == "device"]
+
+    def _query(self):
+        try:
+            return self.client.devices()
+        except AdbError:
+            if self._server_started:
+                raise
+        # adb server未运行时启动一次再重试
+        self._server_started = True
+        start_server()
+        return self.client.devices()
+
+    def add_listener(self, callback):
+        """
+        添加设备变化监听者
+
+        :param callback: 回调函数 callback(设备列表, 新增的设备ID列表, 移除的设备ID列表)，在监听线程中调用
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        移除设备变化监听者
+
+        :param callback: add_listener时传入的回调函数
+        """
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def start_tracking(self):
+        """
+        启动后台设备监听线程（重复调用无副作用）
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._track, name="adb-track-devices", daemon=True)
+            self._thread.start()
+
+    def stop_tracking(self):
+        """
+        停止后台设备监听
+        """
+        self._stop.set()
+        sock = self._track_sock
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        with self._lock:
+            self._devices = None
+
+    def _track(self):
+        while not self._stop.is_set():
+            try:
+                sock = self._track_sock = self.client.connect()
+                with sock:
+                    self.client.send(sock, "host:track-devices")
+                    sock.settimeout(None)
+                    while not self._stop.is_set():
+                        self._update(parse_devices(self.client.read_message(sock).decode("utf-8")))
+            except (AdbError, OSError) as e:
+                if self._stop.is_set():
+                    break
+                logger.debug(f"adb设备监听中断，{self.retry_interval}秒后重连: {e}")
+                if not self._server_started:
+                    self._server_started = True
+                    try:
+                        start_server()
+                    except (OSError, subprocess.SubprocessError):
+                        logger.error("未找到ADB命令，请确保ADB已正确安装并添加到环境变量")
+            finally:
+                self._track_sock = None
+            with self._lock:
+                self._devices = None
+            self._stop.wait(self.retry_interval)
+
+    def _update(self, devices):
+        with self._lock:
+            old = dict(self._devices or list())
+            self._devices = devices
+            listeners = list(self._listeners)
+        new = dict(devices)
+        added = [serial for serial, state in devices if old.get(serial) != state]
+        removed = [serial for serial in old if serial not in new]
+        for serial in removed:
+            with self._lock:
+                device = self._connections.pop(serial, None)
+            if device is not None:
+                device.close()
+        if not (added or removed):
+            return
+        logger.debug(f"adb设备变化: 新增/状态变化 {added}，移除 {removed}")
+        for callback in listeners:
+            try:
+                callback(devices, added, removed)
+            except Exception as e:
+                logger.error(f"设备变化回调出错: {e}")
+
+    def close(self):
+        """
+        停止监听并关闭所有设备连接
+        """
+        self.stop_tracking()
+        with self._lock:
+            devices, self._connections = list(self._connections.values()), dict()
+        for device in devices:
+            device.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_adb_pool():
+    """
+    :return: 进程内共享的adb连接池（命令行和图形界面共用）
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AdbPool()
+        return _pool
@@ -0,0 +1,86 @@
+# -*- encoding=utf8 -*-
+"""
+性能测试脚本，不需要连接设备：python benchmark.py
+"""
+__author__ = "x"
+
+import time
+
+import cv2
+import numpy as np
+
+from capture import AdbRawCapture
+from fake_adb import FakeAdbServer
+from matcher import frame_pyramid, match_best, match_pyramid
+from templates import TemplateLibrary
+
+# 参考截图（1280x720）
+REFERENCE_FRAMES = ["now.png", "images/now.png"]
+
+
+def timeit(func, repeat=20):
+    """
+    多次执行函数取平均耗时
+
+    :param func: 无参函数
+    :param repeat: 执行次数，默认20
+    :return: (平均耗时毫秒, 最后一次的返回值)
+    """
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def bench_match(library, repeat=20):
+    """
+    对比整图彩色匹配与由粗到细金字塔匹配的耗时和结果
+    """
+    print(f"{'截图':<16}{'模板':<12}{'整图(ms)':>10}{'金字塔(ms)':>12}{'加速':>8}  结果")
+    total_full = total_pyramid = 0
+    for path in REFERENCE_FRAMES:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        for name in library.names():
+            template = library.get(name)
+            full_ms, full = timeit(lambda: match_best(frame, template), repeat)
+            # 金字塔匹配的耗时包含构建屏幕金字塔
+            pyramid_ms, fast = timeit(lambda: match_pyramid(frame, template, pyramid=frame_pyramid(frame)), repeat)
+            total_full += full_ms
+            total_pyramid += pyramid_ms
+            if full or fast:
+                same = "一致" if (full and full[:3]) == (fast and fast[:3]) else "不一致"
+                outcome = f"{same} {full.score if full else 0:.3f} / {fast.score if fast else 0:.3f}"
+            else:
+                outcome = "均未命中"
+            print(f"{path:<16}{name:<12}{full_ms:>10.2f}{pyramid_ms:>12.2f}{full_ms / pyramid_ms:>7.1f}x  {outcome}")
+    if total_pyramid:
+        print(f"合计: 整图 {total_full:.1f}ms, 金字塔 {total_pyramid:.1f}ms, 加速 {total_full / total_pyramid:.1f}x")
+
+
+def bench_capture(repeat=20):
+    """
+    在模拟adb server上对比每次截图都走PNG编解码与adb长连接读取原始帧的耗时
+    """
+    fake = FakeAdbServer.from_images(REFERENCE_FRAMES)
+    with fake:
+        client = fake.client()
+        capture = AdbRawCapture(fake.serial, client=client)
+
+        def grab_png():
+            data = client.exec_out(fake.serial, "screencap -p")
+            return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+        png_ms, png = timeit(grab_png, repeat)
+        raw_ms, raw = timeit(capture.grab, repeat)
+        capture.close()
+    same = "一致" if png is not None and raw is not None and np.array_equal(png, raw) else "不一致"
+    print(f"截图 {raw.shape[1]}x{raw.shape[0]}: PNG {png_ms:.2f}ms, 原始帧长连接 {raw_ms:.2f}ms, "
+          f"加速 {png_ms / raw_ms:.1f}x, 画面{same}")
+
+
+if __name__ == "__main__":
+    bench_match(TemplateLibrary("images"))
+    bench_capture()
@@ -0,0 +1,355 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from adb import AdbClient, AdbError, recv_into_exact
+
+# 截图方式：airtest为airtest的snapshot，adb_raw为持久adb连接读取原始帧缓冲
+CAPTURE_AIRTEST = "airtest"
+CAPTURE_ADB_RAW = "adb_raw"
+# screencap原始像素格式：RGBA_8888、RGBX_8888
+RAW_FORMATS = (1, 2)
+
+
+class AirtestCapture(object):
+    """
+    截图采集类，直接从设备获取内存中的帧（numpy数组，BGR格式），不经过磁盘
+    """
+
+    def __init__(self, dump_dir=None):
+        """
+        初始化截图采集器
+
+        :param dump_dir: 调试用的截图保存目录，为None时不写磁盘
+        """
+        self.dump_dir = dump_dir
+
+    def grab(self):
+        """
+        获取当前屏幕帧
+
+        :return: 屏幕图像（numpy数组，BGR格式），获取失败返回None
+        """
+        screen = self._snapshot()
+        if screen is None:
+            logger.warning("截图为空，设备可能已锁屏")
+            return None
+        if self.dump_dir:
+            self.save(screen, os.path.join(self.dump_dir, "now.png"))
+        return screen
+
+    def _snapshot(self):
+        # airtest在这里才导入，adb原始截图、模拟adb server和压测不需要安装airtest
+        from airtest.core.api import G, ST
+        return G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY)
+
+    def close(self):
+        """
+        释放截图资源
+        """
+
+    @staticmethod
+    def save(frame, path):
+        """
+        将帧保存到磁盘（仅用于调试）
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param path: 保存路径
+        """
+        if frame is None:
+            return
+        cv2.imwrite(path, frame)
+
+
+class AdbRawCapture(AirtestCapture):
+    """
+    原始帧缓冲截图：保持一条到设备的adb长连接，每次截图只发送一个换行，
+    设备端直接输出screencap的原始RGBA数据，读入复用的缓冲区后转换为BGR，不经过PNG编解码
+    """
+
+    # 设备端循环：每读到一行执行一次screencap，连接一直保持
+    STREAM_COMMAND = "while read l; do screencap; done"
+
+    def __init__(self, serial, client=None, dump_dir=None):
+        """
+        :param serial: 设备ID
+        :param client: AdbClient，默认连接本机5037端口的adb server
+        :param dump_dir: 调试用的截图保存目录，为None时不写磁盘
+        """
+        super().__init__(dump_dir)
+        self.serial = serial
+        self.client = client or AdbClient()
+        self.header_size = None
+        self._stream = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def probe(self):
+        """
+        执行一次screencap，根据输出长度确定帧头大小（Android 9以上为16字节，更早的版本为12字节）
+
+        :return: (宽, 高, 帧头字节数)
+        :raises ValueError: 输出不是支持的原始帧格式
+        """
+        data = self.client.exec_out(self.serial, "screencap")
+        if len(data) < 12:
+            raise ValueError(f"screencap输出异常，长度{len(data)}字节")
+        width, height, pixel_format = struct.unpack_from("<III", data)
+        if pixel_format not in RAW_FORMATS:
+            raise ValueError(f"不支持的screencap像素格式: {pixel_format}")
+        header_size = len(data) - width * height * 4
+        if header_size not in (12, 16):
+            raise ValueError(f"screencap输出长度与分辨率{width}x{height}不符")
+        return width, height, header_size
+
+    def _open(self):
+        width, height, self.header_size = self.probe()
+        self._buffer = bytearray(self.header_size + width * height * 4)
+        self._stream = self.client.open(self.serial, f"exec:{self.STREAM_COMMAND}")
+        logger.info(f"adb原始截图已连接: {self.serial} {width}x{height}")
+
+    def _read(self):
+        if self._stream is None:
+            self._open()
+        self._stream.sendall(b"\n")
+        recv_into_exact(self._stream, memoryview(self._buffer))
+        width, height, pixel_format = struct.unpack_from("<III", self._buffer)
+        if pixel_format not in RAW_FORMATS or width * height * 4 != len(self._buffer) - self.header_size:
+            # 分辨率变化，数据流已无法对齐，重新连接
+            raise AdbError(f"截图尺寸变化: {width}x{height}")
+        rgba = np.frombuffer(self._buffer, dtype=np.uint8, count=width * height * 4,
+                             offset=self.header_size).reshape(height, width, 4)
+        # 转换结果是新数组，缓冲区可以立即复用
+        return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+    def _snapshot(self):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return self._read()
+                except (AdbError, OSError) as e:
+                    self._close_stream()
+                    if attempt:
+                        logger.warning(f"adb原始截图失败: {e}")
+            return None
+
+    def _close_stream(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except OSError:
+                pass
+        self._stream = None
+
+    def close(self):
+        """
+        关闭adb长连接
+        """
+        with self._lock:
+            self._close_stream()
+
+
+def create_capture(backend=CAPTURE_AIRTEST, serial=None, dump_dir=None, client=None):
+    """
+    按截图方式创建截图采集器
+
+    :param backend: 截图方式，airtest或adb_raw，默认airtest
+    :param serial: 设备ID（adb_raw需要）
+    :param dump_dir: 调试用的截图保存目录
+    :param client: AdbClient（adb_raw可选）
+    :return: 截图采集器
+    """
+    if backend == CAPTURE_AIRTEST:
+        return AirtestCapture(dump_dir=dump_dir)
+    if backend == CAPTURE_ADB_RAW:
+        if not serial:
+            raise ValueError("adb_raw截图方式需要指定设备ID")
+        return AdbRawCapture(serial, client=client, dump_dir=dump_dir)
+    raise ValueError(f"不支持的截图方式: {backend}")
+
+
+class PipelinedCapture(object):
+    """
+    流水线截图：后台线程持续截图并保存在一个很小的环形缓冲区里，识别当前帧的同时下一帧已经在截取。
+    grab总是返回最新的一帧，来不及处理的旧帧直接丢弃，不会排队。
+    """
+
+    def __init__(self, source, depth=2, min_interval=0.05):
+        """
+        :param source: 实际的截图采集器（需要提供grab方法），例如AirtestCapture
+        :param depth: 环形缓冲区保留的帧数，默认2
+        :param min_interval: 两次截图之间的最短间隔（秒），避免空转占满设备，默认0.05秒
+        """
+        self.source = source
+        self.min_interval = min_interval
+        self._frames = deque(maxlen=depth)
+        self._seq = 0
+        self._taken = 0
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """
+        启动后台截图线程
+        """
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+            self._error = None
+        self._thread = threading.Thread(target=self._run, name="capture-pipeline", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止后台截图线程并清空缓冲区
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        with self._cond:
+            self._frames.clear()
+
+    @property
+    def running(self):
+        """
+        :return: 后台截图线程是否在运行
+        """
+        return self._running
+
+    def _run(self):
+        while self._running:
+            start_time = time.time()
+            try:
+                frame = self.source.grab()
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._running = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                if frame is not None:
+                    self._seq += 1
+                    self._frames.append((self._seq, frame))
+                    self._cond.notify_all()
+                # 节流，同时能被stop及时唤醒
+                remaining = self.min_interval - (time.time() - start_time)
+                if remaining > 0 and self._running:
+                    self._cond.wait(remaining)
+
+    def grab(self, timeout=5.0):
+        """
+        获取比上一次返回的帧更新的最新一帧，缓冲区中没有新帧时等待
+
+        :param timeout: 等待新帧的超时时间（秒），默认5秒
+        :return: 屏幕图像（numpy数组，BGR格式），超时或截图线程已停止返回None
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self._frames or self._frames[-1][0] <= self._taken:
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                remaining = deadline - time.time()
+                if not self._running or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._taken, frame = self._frames[-1]
+            return frame
+
+    def save(self, frame, path):
+        """
+        将帧保存到磁盘（仅用于调试）
+        """
+        self.source.save(frame, path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class FrameChangeDetector(object):
+    """
+    画面变化检测器：把帧缩小成灰度小图后与上一次检测时的画面做差，用于跳过重复的OCR/模板匹配
+    """
+
+    def __init__(self, size=(320, 180), threshold=8):
+        """
+        初始化变化检测器
+
+        :param size: 缩略图最大尺寸（宽, 高），默认(320, 180)，720p画面每格4x4像素，出现小按钮或一个数字变化也能检测到；
+                     区域小于该尺寸时按原分辨率比较
+        :param threshold: 缩略图上任一像素灰度差超过该值即认为画面发生变化，默认8
+        """
+        self.size = size
+        self.threshold = threshold
+        self._last = None
+
+    def thumbnail(self, frame):
+        """
+        生成用于比较的灰度缩略图
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :return: 灰度缩略图
+        """
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        width, height = self.size
+        width = min(width, frame.shape[1])
+        height = min(height, frame.shape[0])
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+    def changed(self, frame):
+        """
+        判断画面相对上一次记录的画面是否发生变化，发生变化时更新记录
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :return: 画面有变化（或首次调用）返回True，否则返回False
+        """
+        small = self.thumbnail(frame)
+        if self._last is None or self._last.shape != small.shape:
+            self._last = small
+            return True
+        if int(cv2.absdiff(small, self._last).max()) > self.threshold:
+            self._last = small
+            return True
+        return False
+
+    def reset(self):
+        """
+        清除记录的画面，下一次调用changed必定返回True
+        """
+        self._last = None
+
+
+def crop(frame, roi):
+    """
+    在内存中裁剪帧（不拷贝数据），裁剪区域会被限制在画面范围内
+
+    :param frame: 屏幕图像（numpy数组）
+    :param roi: 裁剪区域 [x1, y1, width, height]，为None时返回原图
+    :return: 裁剪后的图像视图
+    """
+    if frame is None or not roi:
+        return frame
+    x, y, width, height = [int(v) for v in roi]
+    x, y = max(x, 0), max(y, 0)
+    return frame[y:y + height, x:x + width]
@@ -0,0 +1,198 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import os
+import threading
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# 数字字形库路径（运行时从PaddleOCR的识别结果中学习）
+DIGITS_PATH = "images/digits.npz"
+# 字形归一化尺寸（宽, 高）
+GLYPH_SIZE = (12, 18)
+# 低于该相关系数的数字认为不可靠，交给PaddleOCR识别
+MIN_SCORE = 0.8
+
+
+def binarize(gray):
+    """
+    Otsu二值化，前景（文字）为255，前景取像素较少的一侧，亮字暗底和暗字亮底都适用
+
+    :param gray: 灰度图
+    :return: 二值图
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def split_lines(binary, min_height=6):
+    """
+    按水平投影把区域切成多行
+
+    :param binary: 二值图
+    :param min_height: 最小行高（像素），更矮的视为噪点，默认6
+    :return: [(y1, y2), ...]
+    """
+    rows = np.concatenate(([False], binary.any(axis=1), [False]))
+    edges = np.flatnonzero(rows[1:] != rows[:-1]).reshape(-1, 2)
+    return [(int(y1), int(y2)) for y1, y2 in edges if y2 - y1 >= min_height]
+
+
+def split_glyphs(line):
+    """
+    用连通域把一行切成单个字符，高度不足行高60%的连通域（逗号、小数点等）被忽略
+
+    :param line: 一行的二值图
+    :return: [(x1, y1, x2, y2), ...]，按从左到右排列
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(line, connectivity=8)
+    boxes = list()
+    for x, y, width, height, _ in sorted(stats[1:count].tolist()):
+        if height < line.shape[0] * 0.6:
+            continue
+        if boxes and x < boxes[-1][2]:
+            # 与前一个字符横向重叠（同一字符断开的笔画），合并
+            x1, y1, x2, y2 = boxes[-1]
+            boxes[-1] = (x1, min(y1, y), max(x2, x + width), max(y2, y + height))
+        else:
+            boxes.append((x, y, x + width, y + height))
+    return boxes
+
+
+def normalize(glyph):
+    """
+    把单个字符缩放到GLYPH_SIZE并归一化为零均值、单位长度的向量，向量点积即相关系数
+
+    :param glyph: 单个字符的二值图
+    :return: 一维float32向量
+    """
+    vector = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class DigitReader(object):
+    """
+    轻量数字识别：在小区域内切分数字，与字形库做向量化相关匹配，整个过程不到1毫秒。
+    字形库为空或置信度不够时由调用方用PaddleOCR识别，再调用learn把结果加入字形库。
+    """
+
+    def __init__(self, path=DIGITS_PATH, min_score=MIN_SCORE, max_samples=8):
+        """
+        :param path: 字形库文件路径，为None时不持久化
+        :param min_score: 数字的最低相关系数，默认0.8
+        :param max_samples: 每个数字最多保留的字形样本数，默认8
+        """
+        self.path = path
+        self.min_score = min_score
+        self.max_samples = max_samples
+        self.labels = np.zeros(0, dtype="<U1")
+        self.vectors = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                data = np.load(path)
+                self.labels, self.vectors = data["labels"], data["vectors"]
+            except Exception as e:
+                logger.warning(f"数字字形库加载失败: {e}")
+
+    def segment(self, image):
+        """
+        把区域切分为多行数字
+
+        :param image: 区域图像（BGR或灰度）
+        :return: [(行区域(x1, y1, x2, y2), 字符向量矩阵), ...]，按从上到下排列
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        binary = binarize(gray)
+        lines = list()
+        for y1, y2 in split_lines(binary):
+            boxes = split_glyphs(binary[y1:y2])
+            if not boxes:
+                continue
+            vectors = np.stack([normalize(binary[y1 + gy1:y1 + gy2, gx1:gx2]) for gx1, gy1, gx2, gy2 in boxes])
+            lines.append(((boxes[0][0], y1, boxes[-1][2], y2), vectors))
+        return lines
+
+    def classify(self, vectors):
+        """
+        与字形库做相关匹配（一次矩阵乘法完成所有字符）
+
+        :param vectors: 字符向量矩阵
+        :return: (识别出的数字串, 最低相关系数)，字形库为空时返回("", 0)
+        """
+        with self._lock:
+            labels, library = self.labels, self.vectors
+        if not len(library):
+            return "", 0.0
+        scores = vectors @ library.T
+        best = scores.argmax(axis=1)
+        return "".join(labels[best]), float(scores[np.arange(len(best)), best].min())
+
+    def read(self, image):
+        """
+        识别区域内的所有数字行
+
+        :param image: 区域图像（BGR或灰度）
+        :return: [(数字串, 置信度, 行区域(x1, y1, x2, y2)), ...]，按从上到下排列
+        """
+        result = list()
+        for box, vectors in self.segment(image):
+            text, score = self.classify(vectors)
+            result.append((text, score, box))
+        return result
+
+    def confident(self, lines):
+        """
+        :param lines: read的返回值
+        :return: 所有行是否都可信
+        """
+        return bool(lines) and all(text and score >= self.min_score for text, score, _ in lines)
+
+    def learn(self, image, texts):
+        """
+        用其他方式（PaddleOCR）识别出的数字学习字形，行数或字符数对不上时放弃
+
+        :param image: 区域图像（BGR或灰度）
+        :param texts: 区域内从上到下每行的数字串
+        :return: 是否学到了新字形
+        """
+        lines = self.segment(image)
+        if len(lines) != len(texts):
+            return False
+        added = False
+        with self._lock:
+            labels, library = list(self.labels), self.vectors
+            for (_, vectors), text in zip(lines, texts):
+                if len(vectors) != len(text) or not text.isdigit():
+                    continue
+                for label, vector in zip(text, vectors):
+                    same = library[np.asarray(labels, dtype="<U1") == label]
+                    if len(same) >= self.max_samples or (len(same) and float((same @ vector).max()) > 0.98):
+                        continue
+                    labels.append(label)
+                    library = np.vstack([library, vector[None, :]])
+                    added = True
+            if added:
+                self.labels, self.vectors = np.asarray(labels, dtype="<U1"), library
+        if added:
+            self.save()
+        return added
+
+    def save(self):
+        """
+        保存字形库
+        """
+        if not self.path:
+            return
+        with self._lock:
+            labels, vectors = self.labels, self.vectors
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, labels=labels, vectors=vectors)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,236 @@
+# -*- encoding=utf8 -*-
+"""
+本地模拟的adb server，按adb协议返回录制好的截图，不需要连接手机即可测试和压测截图：
+python fake_adb.py [端口] [截图...]
+"""
+__author__ = "x"
+
+import itertools
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+import cv2
+
+from adb import AdbClient, recv_exact
+from capture import AdbRawCapture
+
+
+def encode_raw(frame, header_size=16):
+    """
+    把BGR图像编码为screencap的原始输出格式
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param header_size: 帧头字节数，16（Android 9以上）或12
+    :return: bytes
+    """
+    height, width = frame.shape[:2]
+    header = struct.pack("<III", width, height, 1)
+    if header_size == 16:
+        header += struct.pack("<I", 0)
+    return header + cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA).tobytes()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server.fake
+        sock = self.request
+        try:
+            while True:
+                request = recv_exact(sock, int(recv_exact(sock, 4), 16)).decode("utf-8")
+                server.requests.append(request)
+                if not server.serve(sock, request):
+                    return
+        except (ValueError, OSError):
+            return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeAdbServer(object):
+    """
+    模拟adb server：支持host:version、host:devices、host:track-devices、host:transport、exec:screencap（含-p）、
+    AdbRawCapture使用的截图长连接、InputChannel使用的持久shell以及shell命令（只记录，不执行）
+    """
+
+    def __init__(self, frames, serial="fake-5554", host="127.0.0.1", port=0, header_size=16):
+        """
+        :param frames: 录制的屏幕帧列表（numpy数组，BGR格式），按顺序循环返回
+        :param serial: 模拟的设备ID
+        :param host: 监听地址，默认127.0.0.1
+        :param port: 监听端口，默认0（随机空闲端口）
+        :param header_size: screencap帧头字节数，默认16
+        """
+        if not frames:
+            raise ValueError("至少需要一帧截图")
+        self.serial = serial
+        self.devices = [(serial, "device")]
+        self.frames = list(frames)
+        self.raw_frames = [encode_raw(frame, header_size) for frame in self.frames]
+        self.requests = list()
+        self.shell_commands = list()
+        self._streams = set()
+        self._next = itertools.cycle(range(len(self.frames)))
+        self._lock = threading.Lock()
+        self._devices_changed = threading.Condition(self._lock)
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @classmethod
+    def from_images(cls, paths, **kwargs):
+        """
+        从截图文件创建模拟server
+
+        :param paths: 截图路径列表，读取失败的会被跳过
+        :return: FakeAdbServer
+        """
+        frames = [frame for frame in (cv2.imread(path) for path in paths) if frame is not None]
+        return cls(frames, **kwargs)
+
+    @property
+    def port(self):
+        """
+        :return: 实际监听的端口
+        """
+        return self._server.server_address[1]
+
+    def client(self, timeout=10):
+        """
+        :return: 连接到本模拟server的AdbClient
+        """
+        return AdbClient(self._server.server_address[0], self.port, timeout)
+
+    def start(self):
+        """
+        在后台线程中启动server
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-adb", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止server
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_devices(self, devices):
+        """
+        修改模拟的设备列表，正在监听host:track-devices的连接会收到通知
+
+        :param devices: 设备列表，格式为[(设备ID, 设备状态), ...]
+        """
+        with self._devices_changed:
+            self.devices = list(devices)
+            self._devices_changed.notify_all()
+
+    def drop_streams(self):
+        """
+        断开所有截图长连接（模拟设备断线或adb server重启）
+        """
+        with self._lock:
+            streams = list(self._streams)
+        for sock in streams:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _devices_message(self):
+        return "".join(f"{serial}\t{state}\n" for serial, state in self.devices).encode("utf-8")
+
+    def next_index(self):
+        with self._lock:
+            return next(self._next)
+
+    def serve(self, sock, request):
+        """
+        处理一个请求
+
+        :return: 是否继续在同一连接上读取下一个请求（host:transport之后为True）
+        """
+        if request == "host:version":
+            self._reply(sock, b"0029")
+        elif request == "host:devices":
+            self._reply(sock, self._devices_message())
+        elif request == "host:track-devices":
+            # 先应答OKAY，之后每次设备变化发送一条带长度前缀的设备列表
+            sock.sendall(b"OKAY")
+            with self._devices_changed:
+                while True:
+                    devices = self.devices
+                    message = self._devices_message()
+                    sock.sendall(b"%04x" % len(message) + message)
+                    self._devices_changed.wait_for(lambda: self.devices is not devices)
+        elif request.startswith("host:transport:"):
+            if (request[len("host:transport:"):], "device") not in self.devices:
+                self._fail(sock, "device not found")
+                return False
+            sock.sendall(b"OKAY")
+            return True
+        elif request == "exec:screencap":
+            sock.sendall(b"OKAY" + self.raw_frames[self.next_index()])
+        elif request == "exec:screencap -p":
+            _, png = cv2.imencode(".png", self.frames[self.next_index()])
+            sock.sendall(b"OKAY" + png.tobytes())
+        elif request == f"exec:{AdbRawCapture.STREAM_COMMAND}":
+            sock.sendall(b"OKAY")
+            with self._lock:
+                self._streams.add(sock)
+            try:
+                reader = sock.makefile("rb")
+                while reader.readline():
+                    sock.sendall(self.raw_frames[self.next_index()])
+            finally:
+                with self._lock:
+                    self._streams.discard(sock)
+        elif request == "exec:sh":
+            # 持久shell（InputChannel）：记录每条命令，遇到echo时回显
+            sock.sendall(b"OKAY")
+            reader = sock.makefile("rb")
+            for line in reader:
+                for command in line.decode("utf-8").strip().split("; "):
+                    if command.startswith("echo "):
+                        sock.sendall(command[5:].encode("utf-8") + b"\n")
+                    elif command:
+                        self.shell_commands.append(command)
+        elif request.startswith(("shell:", "exec:")):
+            sock.sendall(b"OKAY")
+            self.shell_commands.append(request.split(":", 1)[1])
+        else:
+            self._fail(sock, f"unknown service {request}")
+        return False
+
+    @staticmethod
+    def _reply(sock, message):
+        sock.sendall(b"OKAY" + b"%04x" % len(message) + message)
+
+    @staticmethod
+    def _fail(sock, message):
+        message = message.encode("utf-8")
+        sock.sendall(b"FAIL" + b"%04x" % len(message) + message)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5038
+    paths = sys.argv[2:] or ["images/now.png"]
+    with FakeAdbServer.from_images(paths, port=port) as fake:
+        print(f"模拟adb server已启动: 127.0.0.1:{fake.port}，设备ID {fake.serial}，Ctrl+C退出")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
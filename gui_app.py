@@ -11,10 +11,15 @@ from datetime import datetime, timedelta
 import schedule
 from loguru import logger
 import sys
-import subprocess
+import multiprocessing
 
 # 导入原有的模块
 from main import MCCAA, DeviceManager
+from adb import get_adb_pool
+from ocr_engine import get_default_ocr, get_registry, format_memory, BACKEND_PROCESS, STATUS_IDLE, STATUS_LOADING, STATUS_READY
+
+# 图形界面把OCR放到独立的工作进程中执行，识别时界面不会卡顿
+OCR_BACKEND = BACKEND_PROCESS
 
 
 class MCCAAGUIApp:
@@ -47,6 +52,7 @@ class MCCAAGUIApp:
         self.device_manager = None
         self.mccaa_instance = None
         self.is_device_connected = False
+        self.connected_device = None
         
         # 定时任务相关
         self.scheduler_thread = None
@@ -60,6 +66,13 @@ class MCCAAGUIApp:
         # 设置日志输出到GUI
         self.setup_logging()
         
+        # 窗口显示后在后台预热OCR引擎
+        self.root.after(100, self.start_ocr_warm_up)
+
+        # 监听ADB设备变化，已连接的设备断开时更新状态
+        get_adb_pool().add_listener(self.on_devices_changed)
+        get_adb_pool().start_tracking()
+        
     def create_widgets(self):
         """
         创建GUI组件
@@ -144,6 +157,9 @@ class MCCAAGUIApp:
         self.device_status_label = ttk.Label(device_control_frame, text="设备未连接", foreground="red")
         self.device_status_label.pack(side=tk.LEFT)
         
+        self.ocr_status_label = ttk.Label(device_frame, text=f"OCR引擎: {STATUS_IDLE}", foreground="gray")
+        self.ocr_status_label.pack(anchor=tk.W, pady=(5, 0))
+        
         # 任务执行区域
         task_frame = ttk.LabelFrame(self.scrollable_frame, text="任务执行", padding="5")
         task_frame.pack(fill=tk.X, pady=(0, 10))
@@ -221,6 +237,30 @@ class MCCAAGUIApp:
         
 
         
+    def start_ocr_warm_up(self):
+        """
+        在后台线程中预热OCR引擎，界面可以立即操作
+        """
+        get_default_ocr(OCR_BACKEND).warm_up()
+        self.update_ocr_status()
+        
+    def update_ocr_status(self):
+        """
+        刷新OCR引擎状态显示，加载完成前每0.5秒刷新一次
+        """
+        engine = get_default_ocr(OCR_BACKEND)
+        text = f"OCR引擎: {engine.status}"
+        if engine.status == STATUS_READY:
+            color = "green"
+            text += f"（内存 {format_memory(get_registry().total_memory() or None)}）"
+        elif engine.status in (STATUS_IDLE, STATUS_LOADING):
+            color = "orange"
+        else:
+            color = "red"
+        self.ocr_status_label.config(text=text, foreground=color)
+        if engine.status in (STATUS_IDLE, STATUS_LOADING):
+            self.root.after(500, self.update_ocr_status)
+        
     def setup_logging(self):
         """
         设置日志输出到GUI
@@ -266,46 +306,33 @@ class MCCAAGUIApp:
         self.log_text.delete(1.0, tk.END)
         self.log_text.config(state="disabled")
         
-    def get_adb_devices(self):
+    def on_devices_changed(self, devices, added, removed):
         """
-        获取当前可用的ADB设备列表
-        
-        :return: 设备列表，格式为[(设备ID, 设备状态), ...]
+        ADB设备变化回调（在监听线程中调用，界面更新交给主线程）
+
+        :param devices: 当前设备列表
+        :param added: 新增或状态变化的设备ID列表
+        :param removed: 移除的设备ID列表
         """
-        try:
-            result = subprocess.run(['adb', 'devices'], capture_output=True, text=True, encoding='utf-8')
-            if result.returncode != 0:
-                logger.error("ADB命令执行失败，请确保ADB已正确安装并添加到环境变量")
-                return []
-            
-            lines = result.stdout.strip().split('\n')
-            devices = []
-            
-            for line in lines[1:]:  # 跳过第一行标题
-                if line.strip():
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        device_id = parts[0].strip()
-                        status = parts[1].strip()
-                        if status == 'device':  # 只返回正常连接的设备
-                            devices.append((device_id, status))
-            
-            return devices
-        except FileNotFoundError:
-            logger.error("未找到ADB命令，请确保ADB已正确安装并添加到环境变量")
-            return []
-        except Exception as e:
-            logger.error(f"获取ADB设备列表失败: {e}")
-            return []
-    
+        device = self.connected_device
+        if not device:
+            return
+        if device in removed:
+            logger.warning(f"设备已断开: {device}")
+            self.root.after(0, lambda: self.device_status_label.config(text=f"设备已断开: {device}", foreground="red"))
+        elif device in added and (device, "device") in devices:
+            logger.info(f"设备已重新连接: {device}")
+            self.root.after(0, lambda: self.device_status_label.config(text=f"设备已连接: {device}", foreground="green"))
+
     def show_device_selection_dialog(self):
         """
         显示设备选择对话框
         
         :return: 选择的设备ID，如果取消选择则返回None
         """
-        # 获取可用设备
-        devices = self.get_adb_devices()
+        # 获取可用设备（与命令行共用DeviceManager的adb连接池）
+        device_manager = DeviceManager()
+        devices = device_manager.get_adb_devices()
         
         if not devices:
             messagebox.showerror("错误", 
@@ -316,7 +343,6 @@ class MCCAAGUIApp:
             return None
         
         # 检查是否有保存的设备配置
-        device_manager = DeviceManager()
         last_device = device_manager.config.get('last_device')
         
         # 创建设备选择对话框
@@ -433,9 +459,14 @@ class MCCAAGUIApp:
                 from airtest.core.api import connect_device
                 connect_device(connect_string)
                 
-                # 创建游戏实例
-                self.mccaa_instance = MCCAA()
+                # 创建游戏实例（OCR引擎由注册表共享，重新连接不会重复加载模型）
+                if self.mccaa_instance is not None:
+                    self.mccaa_instance.close()
+                self.mccaa_instance = MCCAA(ocr_backend=OCR_BACKEND,
+                                           capture=self.device_manager.create_capture(selected_device),
+                                           input_channel=self.device_manager.create_input(selected_device))
                 self.is_device_connected = True
+                self.connected_device = selected_device
                 
                 # 更新UI状态
                 self.root.after(0, lambda: (
@@ -615,4 +646,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包成exe后OCR工作进程需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
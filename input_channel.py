@@ -0,0 +1,97 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import itertools
+import threading
+
+from adb import AdbError, get_adb_pool
+
+
+class InputChannel(object):
+    """
+    设备输入通道：保持一个持久的设备端shell，一串点击和间隔连同结束标记一次性发送，
+    在设备端顺序执行，整串点击只需要一次往返
+    """
+
+    # 在设备连接上的数据流名称
+    STREAM = "input"
+
+    def __init__(self, serial, pool=None, tap_timeout=2.0):
+        """
+        :param serial: 设备ID
+        :param pool: AdbPool，默认使用进程内共享的连接池
+        :param tap_timeout: 每次点击预留的执行时间（秒），用于计算整串点击的超时，默认2秒
+        """
+        self.serial = serial
+        self.device = (pool or get_adb_pool()).device(serial)
+        self.tap_timeout = tap_timeout
+        self._markers = itertools.count()
+        self._lock = threading.Lock()
+
+    def tap(self, point):
+        """
+        点击一个坐标
+
+        :param point: 坐标 (x, y)
+        """
+        self.tap_batch([point], 0)
+
+    def tap_batch(self, points, delay=0.1):
+        """
+        在设备端依次点击多个坐标
+
+        :param points: 坐标列表，元素为(x, y)，或(x, y, 点击后的等待秒数)覆盖默认间隔
+        :param delay: 相邻两次点击之间的默认间隔（秒），默认0.1秒
+        :raises AdbError: 设备连接失败
+        """
+        commands = list()
+        timeout = 5.0
+        for i, point in enumerate(points):
+            x, y = point[:2]
+            if i:
+                commands.append(f"sleep {wait:g}")
+            commands.append(f"input tap {int(round(x))} {int(round(y))}")
+            wait = point[2] if len(point) > 2 else delay
+            timeout += self.tap_timeout + wait
+        if commands:
+            self.run(commands, timeout)
+
+    def run(self, commands, timeout=10.0):
+        """
+        在持久shell中执行一组命令并等待全部执行完毕，连接断开时重连一次
+
+        :param commands: shell命令列表
+        :param timeout: 等待执行完毕的超时时间（秒）
+        :raises AdbError: 设备连接失败
+        """
+        marker = f"__mccaa_done_{next(self._markers)}__"
+        script = ("; ".join(commands) + f"; echo {marker}\n").encode("utf-8")
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    sock = self.device.stream(self.STREAM, "exec:sh")
+                    sock.settimeout(timeout)
+                    sock.sendall(script)
+                    self._read_until(sock, marker.encode("utf-8"))
+                    return
+                except (AdbError, OSError) as e:
+                    self.device.reset(self.STREAM)
+                    if attempt:
+                        raise AdbError(f"输入通道执行失败({self.serial}): {e}")
+
+    @staticmethod
+    def _read_until(sock, marker):
+        output = bytearray()
+        while marker not in output:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise AdbError("输入通道已断开")
+            output += chunk
+            # 只保留末尾，避免命令输出过多时缓冲区无限增长
+            del output[:-4096]
+
+    def close(self):
+        """
+        关闭持久shell
+        """
+        self.device.reset(self.STREAM)
@@ -0,0 +1,110 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import json
+import os
+import threading
+
+from loguru import logger
+
+# 文字位置记忆的默认路径
+LOCATIONS_PATH = "cache/locations.json"
+
+
+class LocationMemory(object):
+    """
+    文字位置记忆：记录每个界面中每个目标文字上次出现的文本框（以及同一行左右相邻文本框的边界），
+    下次先只识别这个小框，界面布局基本不变时可以跳过整屏文字检测
+    """
+
+    def __init__(self, path=LOCATIONS_PATH, save_delay=5.0):
+        """
+        :param path: 持久化文件路径，为None时只保存在内存中
+        :param save_delay: 位置变化后延迟多久（秒）写入文件，期间的多次变化只写一次，默认5秒
+        """
+        self.path = path
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self._boxes = dict()
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._boxes = {key: tuple(box) for key, box in json.load(f).items()}
+            except Exception as e:
+                logger.warning(f"文字位置记忆加载失败: {e}")
+
+    @staticmethod
+    def _key(scene, text):
+        return f"{scene or ''}\t{text}"
+
+    def get(self, scene, text):
+        """
+        :param scene: 界面名称，未知时为None
+        :param text: 目标文字
+        :return: 上次的文本框 (x1, y1, x2, y2)，记录了相邻边界时为 (x1, y1, x2, y2, 左边界, 右边界)，没有记录返回None
+        """
+        with self._lock:
+            return self._boxes.get(self._key(scene, text))
+
+    def put(self, scene, text, box, limits=None):
+        """
+        记录目标文字的位置，位置有变化时延迟写入文件
+
+        :param scene: 界面名称，未知时为None
+        :param text: 目标文字
+        :param box: 文本框 (x1, y1, x2, y2)
+        :param limits: 同一行左右相邻文本框的边界 (左侧文本框的右边, 右侧文本框的左边)，没有相邻文本框的一侧为None
+        """
+        box = tuple(int(round(value)) for value in box)
+        if limits is not None:
+            box += tuple(None if value is None else int(round(value)) for value in limits)
+        with self._lock:
+            if self._boxes.get(self._key(scene, text)) == box:
+                return
+            self._boxes[self._key(scene, text)] = box
+        self._schedule_save()
+
+    def forget(self, scene, text):
+        """
+        删除目标文字的位置记录
+
+        :param scene: 界面名称，未知时为None
+        :param text: 目标文字
+        """
+        with self._lock:
+            if self._boxes.pop(self._key(scene, text), None) is None:
+                return
+        self._schedule_save()
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if not self.path or self._timer is not None:
+                return
+            self._timer = threading.Timer(self.save_delay, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def save(self):
+        """
+        把未保存的变化写入文件
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.path or not self._dirty:
+                    return
+                self._dirty = False
+                boxes = dict(self._boxes)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(boxes, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
@@ -6,23 +6,47 @@ import threading
 import time
 import json
 import os
-import subprocess
 
 from concurrent.futures import ThreadPoolExecutor
 import traceback
 import Levenshtein
-from airtest.core.api import snapshot, touch, wait, Template, G, connect_device, ST, start_app, stop_app
+from airtest.core.api import wait, Template, G, connect_device, ST, start_app, stop_app
 from loguru import logger
-from paddleocr import PaddleOCR
-from PIL import Image
+from adb import AdbError, get_adb_pool
+from capture import AirtestCapture, CAPTURE_AIRTEST, create_capture
+from input_channel import InputChannel
+from ocr_engine import BACKEND_LOCAL, get_registry
 from my_tools import Tools
+from scenes import Navigator
 
+# 战力不超过该值的对手才挑战
+ARENA_MAX_POWER = 30000
+# 订单卡片相对"构建订单"标题的竖直偏移（像素）。订单卡片上没有可以稳定识别、能和其他文字区分的文本
+# （没有量取过订单界面的参考截图），无法用OcrResult的相对位置查询定位，只能按标题位置加固定偏移点击
+TRADE_ORDER_OFFSET = 200
 
-def debugOcr():
+
+def debugOcr(tools=None):
+    """
+    保存现场截图并打印整屏OCR结果
+
+    :param tools: 出错任务的Tools实例，传入时复用它的截图和OCR引擎（GUI中为进程外引擎），不会额外加载模型
+    """
     pic_path = r"images/now.png"
-    snapshot(pic_path)
-    ocr = PaddleOCR(use_angle_cls=True, lang="ch")
-    ocr_result = ocr.ocr(pic_path, cls=True)
+    frame = tools.get_screen() if tools is not None else AirtestCapture().grab()
+    # 调试时把现场截图保存下来
+    AirtestCapture.save(frame, pic_path)
+    if frame is None:
+        return
+    if tools is not None and tools.ocr is not None:
+        ocr_result = tools.ocr.ocr(frame, cls=True)
+    else:
+        # 复用共享的OCR引擎，任务失败时不再额外加载一份模型
+        ocr = get_registry().acquire(use_angle_cls=True, lang="ch")
+        try:
+            ocr_result = ocr.ocr(frame, cls=True)
+        finally:
+            get_registry().release(ocr)
     for line in ocr_result:
         for word_info in line:
             # 获取识别结果的文字信息
@@ -34,20 +58,19 @@ def debugOcr():
 
 
 def cropped_image(x1, y1, x2, y2):
-    pic_path = r"images/now.png"
-    snapshot(pic_path)
-
     # 新增：图片裁剪逻辑（需根据实际需求调整裁剪坐标）
 
-    # 读取原始图片
-    img = Image.open(pic_path)
+    # 直接获取内存中的屏幕帧
+    img = AirtestCapture().grab()
+    if img is None:
+        return
     # 定义裁剪区域（左上角x, 左上角y, 宽度, 高度），需根据实际屏幕区域调整
     # 示例：裁剪屏幕中间 500x500 的区域（左上角坐标(290,710)，宽度500，高度500）
 
-    cropped_img = img.crop((x1, y1, x1 + x2, y1 + y2))
+    cropped_img = img[y1:y1 + y2, x1:x1 + x2]
     # 保存裁剪后的图片
     cropped_path = r"./cropped_now.png"
-    cropped_img.save(cropped_path)
+    AirtestCapture.save(cropped_img, cropped_path)
 
 
 class DeviceManager:
@@ -62,6 +85,9 @@ class DeviceManager:
         """
         self.config_file = config_file
         self.config = self.load_config()
+        # 共享的adb连接池，后台监听设备变化，获取设备列表不再启动adb进程
+        self.adb_pool = get_adb_pool()
+        self.adb_pool.start_tracking()
     
     def load_config(self):
         """
@@ -89,6 +115,46 @@ class DeviceManager:
         except Exception as e:
             logger.error(f"保存配置文件失败: {e}")
     
+    def get_capture_backend(self, device_id):
+        """
+        获取设备的截图方式，配置文件中未指定时使用airtest
+
+        :param device_id: 设备ID
+        :return: 截图方式，airtest或adb_raw
+        """
+        return self.config.get('capture_backend', {}).get(device_id, CAPTURE_AIRTEST)
+
+    def set_capture_backend(self, device_id, backend):
+        """
+        设置设备的截图方式并保存到配置文件
+
+        :param device_id: 设备ID
+        :param backend: 截图方式，airtest或adb_raw
+        """
+        self.config.setdefault('capture_backend', {})[device_id] = backend
+        self.save_config()
+
+    def create_capture(self, device_id=None):
+        """
+        按配置为设备创建截图采集器
+
+        :param device_id: 设备ID，默认为上次使用的设备
+        :return: 截图采集器
+        """
+        device_id = device_id or self.config.get('last_device')
+        backend = self.get_capture_backend(device_id)
+        logger.info(f"设备 {device_id} 使用截图方式: {backend}")
+        return create_capture(backend, serial=device_id, client=self.adb_pool.client)
+
+    def create_input(self, device_id=None):
+        """
+        为设备创建输入通道（持久shell，连续点击一次往返）
+
+        :param device_id: 设备ID，默认为上次使用的设备
+        :return: InputChannel
+        """
+        return InputChannel(device_id or self.config.get('last_device'), pool=self.adb_pool)
+
     def get_adb_devices(self):
         """
         获取当前可用的ADB设备列表
@@ -96,24 +162,11 @@ class DeviceManager:
         :return: 设备列表，格式为[(设备ID, 设备状态), ...]
         """
         try:
-            result = subprocess.run(['adb', 'devices'], capture_output=True, text=True, encoding='utf-8')
-            if result.returncode != 0:
-                logger.error("ADB命令执行失败，请确保ADB已正确安装并添加到环境变量")
-                return []
-            
-            lines = result.stdout.strip().split('\n')
-            devices = []
-            
-            for line in lines[1:]:  # 跳过第一行标题
-                if line.strip():
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        device_id = parts[0].strip()
-                        status = parts[1].strip()
-                        if status == 'device':  # 只返回正常连接的设备
-                            devices.append((device_id, status))
-            
-            return devices
+            # 只返回正常连接的设备
+            return self.adb_pool.online_devices()
+        except AdbError:
+            logger.error("ADB命令执行失败，请确保ADB已正确安装并添加到环境变量")
+            return []
         except FileNotFoundError:
             logger.error("未找到ADB命令，请确保ADB已正确安装并添加到环境变量")
             return []
@@ -208,8 +261,15 @@ class DeviceManager:
 
 # 空白点 600，500
 class MCCAA(object):
-    def __init__(self):
-        self.tools = Tools()
+    def __init__(self, ocr_backend=BACKEND_LOCAL, capture=None, input_channel=None):
+        """
+        :param ocr_backend: OCR运行方式，local或process（图形界面使用process，识别时界面不卡顿）
+        :param capture: 截图采集器，为None时使用airtest截图（可由DeviceManager.create_capture按设备配置创建）
+        :param input_channel: 设备输入通道，为None时使用airtest点击（可由DeviceManager.create_input创建）
+        """
+        self.tools = Tools(ocr_backend=ocr_backend, capture=capture, input_channel=input_channel)
+        # 任务从当前所在界面出发，按界面图的最短路径前往目标界面
+        self.navigator = Navigator(self.tools)
         self.COMMON_COORDINATES = {
             'blank_point': (600, 500),  # 空白点
             'purchase_count_point': (220, 50)  # home点的位置
@@ -222,51 +282,58 @@ class MCCAA(object):
         流程说明：
         1. 启动游戏应用（包名：com.megagame.crosscore.bilibili）
         2. 等待"开始游戏"按钮出现（最长等待180秒）
-        3. 关闭"今天不再提示"弹窗（2次）
+        3. 关闭"今天不再提示"弹窗（数量不固定）
         4. 点击"签到"按钮完成每日签到
         5. 关闭流程结束提示（break图片）
         """
         start_app("com.megagame.crosscore.bilibili")
         self.tools.click_txt("开始游戏", timeout=180)
-        self.tools.click_txt_le("今天不再提示", timeout=50)
-        self.tools.click_image("x", threshold=0.6)
-        self.tools.click_txt_le("今天不再提示", timeout=10)
-        self.tools.click_image("x", threshold=0.6)
-        self.tools.click_txt("签到")
-        self.tools.click_image("break", threshold=0.6)
+        # 弹窗和签到哪个先出现就处理哪个，不再逐个等待超时
+        deadline = time.time() + 50
+        while True:
+            data = self.tools.exists_any_txt([("今天不再提示", "le"), "签到"], timeout=max(deadline - time.time(), 0))
+            if not data:
+                break
+            target_text, coordinate = data
+            self.tools.wait_settle(0.5)
+            self.tools.tap(coordinate)
+            if target_text == "签到":
+                self.tools.click_image("break", threshold=0.6)
+                break
+            self.tools.click_image("x", threshold=0.6)
 
     def task(self):
         """
         领取日常任务
         :return:
         """
-        self.tools.click_txt("任务")
-        self.tools.click_txt("日常")
-        self.tools.click_txt_le("一键领取")
-        # s
-        touch(self.COMMON_COORDINATES['blank_point'])
-        self.tools.click_txt("周常")
-        self.tools.click_txt_le("一键领取")
-        # s
-        touch(self.COMMON_COORDINATES['blank_point'])
-        self.tools.click_image("home")
-        self.tools.click_txt("勘探指南")
-        self.tools.click_txt("任务")
-        self.tools.click_txt("每日任务")
-        self.tools.click_txt("领取奖励")
-        self.tools.click_txt("获得物品")
-        self.tools.click_txt("每周任务")
-        self.tools.click_txt("领取奖励")
-        self.tools.click_txt("获得物品")
-        self.tools.click_txt("本期任务")
-        self.tools.click_txt("领取奖励")
-        self.tools.click_txt("获得物品")
-        touch(self.COMMON_COORDINATES['purchase_count_point'])
+        self.navigator.goto("task")
+        # 领取过程中跳到了其他界面时重新导航回来继续
+        with self.navigator.expect("task", reroute=True):
+            self.tools.click_txt("日常")
+            self.tools.click_txt_le("一键领取")
+            # s
+            self.tools.tap(self.COMMON_COORDINATES['blank_point'])
+            self.tools.click_txt("周常")
+            self.tools.click_txt_le("一键领取")
+            # s
+            self.tools.tap(self.COMMON_COORDINATES['blank_point'])
+        self.navigator.goto("guide")
+        with self.navigator.expect("guide", reroute=True):
+            self.tools.click_txt("每日任务")
+            self.tools.click_txt("领取奖励")
+            self.tools.click_txt("获得物品")
+            self.tools.click_txt("每周任务")
+            self.tools.click_txt("领取奖励")
+            self.tools.click_txt("获得物品")
+            self.tools.click_txt("本期任务")
+            self.tools.click_txt("领取奖励")
+            self.tools.click_txt("获得物品")
+        self.tools.tap(self.COMMON_COORDINATES['purchase_count_point'])
         data = self.tools.exists_txt("全部领取")
         if data:
             self.tools.click_txt("全部领取")
             self.tools.click_txt("获得物品")
-        self.tools.click_image("home")
 
 
 
@@ -275,92 +342,125 @@ class MCCAA(object):
         演习
         :return:
         """
-        self.tools.click_txt("出击")
-        self.tools.click_txt("模拟军演")
-        self.tools.click_txt("镜像竞技")
+        self.navigator.goto("arena")
 
-        # for i in range(10):
-        while True:
-            self.tools.exists_ocr("战力")
-            data = self.tools.get_ocr_cropped_result(cropped=[1022, 150, 82, 23])[0]
-            power, coordinate = data.popitem()
-            if int(power) > 30000:
-                self.tools.click_image("refresh", threshold=0.6)
-                continue
-            else:
-                touch(coordinate)
-                if self.tools.exists_ocr("今日可购买的模拟次数", timeout=3):
-                    touch(self.COMMON_COORDINATES['purchase_count_point'])
-                    self.tools.click_image("home")
-                    return
-                self.tools.click_txt("挑战")
-                self.tools.click_txt("战斗胜利", timeout=120, click_timeout=2)
-                self.tools.click_txt("获得物品")
+        # 画面停在其他已知界面时立即失败，不再逐个等待超时
+        with self.navigator.expect("arena"):
+            # for i in range(10):
+            while True:
+                # 一帧画面中找出每个"战力"标签读出对手的战力，挑最弱的
+                opponents = self.tools.wait_screen(self.scan_opponents)
+                if not opponents:
+                    raise ValueError("没识别到对手战力")
+                candidates = [opponent for opponent in opponents if opponent[0] <= ARENA_MAX_POWER]
+                if not candidates:
+                    self.tools.click_image("refresh", threshold=0.6)
+                    continue
+                else:
+                    power, coordinate = min(candidates)
+                    logger.debug(f"对手战力: {[opponent[0] for opponent in opponents]}，挑战: {power}")
+                    self.tools.tap(coordinate)
+                    if self.tools.exists_ocr("今日可购买的模拟次数", timeout=3):
+                        self.tools.tap(self.COMMON_COORDINATES['purchase_count_point'])
+                        return
+                    self.tools.click_txt("挑战")
+                    self.tools.click_txt("战斗胜利", timeout=120, click_timeout=2)
+                    self.tools.click_txt("获得物品")
+
+    def scan_opponents(self, frame=None):
+        """
+        从一帧画面中读出镜像竞技所有对手的战力
+
+        :param frame: 屏幕帧，为None时重新截图
+        :return: [(战力, 点击坐标), ...]，按从上到下排列，没识别到时返回空列表
+        """
+        if frame is None:
+            frame = self.tools.get_screen()
+        # 先确认是镜像竞技界面，和读战力共用同一次整屏OCR
+        if frame is None or self.navigator.classifier.classify(frame) != "arena":
+            return list()
+        result = self.tools.ocr_result(frame)
+        opponents = list()
+        for label in result.find("战力", "ocr"):
+            # 战力数字可能和"战力"识别在同一个文本框里，否则取同一行右侧最近的数字
+            digits = re.sub(r"\D", "", label.text.split("战力", 1)[1])
+            box = label
+            if not digits:
+                box = result.nearest_right(label, lambda found: re.fullmatch(r"[\d,]+", found.text) is not None)
+                if box is None:
+                    continue
+                digits = re.sub(r"\D", "", box.text)
+            opponents.append((int(digits), box.center))
+        return opponents
 
     def trade(self):
         """
         换票
         :return:
         """
-        self.tools.click_txt("基地")
-
-        self.tools.exists_image("trade", threshold=0.9)
-        self.tools.click_image("trade", threshold=0.9)
+        self.navigator.goto("trade")
 
         def touch_money():
-            data = self.tools.exists_ocr("构建订单", timeout=3)
-            if data:
-                tempList = list(data)
-                tempList[1] += 200
-                data = tuple(tempList)
-                touch(data)
+            label = self.tools.exists_ocr("构建订单", timeout=3)
+            if label:
+                # 订单卡片在标题下方固定偏移处（原因见TRADE_ORDER_OFFSET），直接用找到标题的那次识别结果，不再重新截图识别
+                x, y = label
+                self.tools.tap((x, y + TRADE_ORDER_OFFSET))
                 if self.tools.exists_ocr("订单兑换所需素材不足", timeout=3):
                     return False
                 self.tools.click_txt("确定", timeout=3)
                 self.tools.click_txt("获得物品", timeout=3)
 
-        touch_money()
-        # if not sings:
-        #     self.tools.click_txt("取消")
-        #     self.tools.click_image("home")
-        #     return
-        self.tools.click_txt("选择好友")
-        self.tools.click_txt("拜访")
+        # 拜访好友后画面是好友的基地
+        with self.navigator.expect("trade", "base"):
+            touch_money()
+            # if not sings:
+            #     self.tools.click_txt("取消")
+            #     self.tools.click_image("home")
+            #     return
+            self.tools.click_txt("选择好友")
+            self.tools.click_txt("拜访")
 
-        while True:
-            sings = touch_money()
-            if not sings:
-                self.tools.click_txt("取消")
-                self.tools.click_image("home")
-                return
-            data = self.tools.exists_image("next", timeout=3, threshold=0.9)
-            if data:
-                touch(data)
-            else:
-                break
-        self.tools.click_image("home")
+            while True:
+                sings = touch_money()
+                if not sings:
+                    self.tools.click_txt("取消")
+                    self.tools.click_image("home")
+                    return
+                data = self.tools.exists_image("next", timeout=3, threshold=0.9)
+                if data:
+                    self.tools.tap(data)
+                else:
+                    break
+            self.tools.click_image("home")
 
     def change(self):
         """
         合成黑匣
         :return:
         """
-        self.tools.click_txt("基地")
+        self.navigator.goto("base")
         data = self.tools.exists_image("mine", timeout=3, threshold=0.9)
         if not data:
-            self.tools.click_image("home")
+            # 留在基地，下一个任务从这里出发
             return
-        self.tools.click_image("mine", threshold=0.9)
-        self.tools.click_txt("获得物品")
-        self.tools.click_txt("合成工厂")
-        self.tools.click_image("factory")
-        self.tools.click_txt("基地素材")
-        self.tools.click_txt("稀有黑匣")
-        self.tools.click_image("next_fast", threshold=0.8)
-        self.tools.click_txt("确定")
-        self.tools.click_txt("获得物品")
-        self.tools.click_txt("合成成功")
-        self.tools.click_image("home")
+        with self.navigator.expect("base", "factory"):
+            self.tools.click_image("mine", threshold=0.9)
+            self.tools.click_txt("获得物品")
+            self.tools.click_txt("合成工厂")
+            self.tools.click_image("factory")
+            self.tools.click_txt("基地素材")
+            self.tools.click_txt("稀有黑匣")
+            self.tools.click_image("next_fast", threshold=0.8)
+            self.tools.click_txt("确定")
+            self.tools.click_txt("获得物品")
+            self.tools.click_txt("合成成功")
+
+    def close(self):
+        """
+        释放工具类占用的资源（共享OCR引擎的引用等）
+        """
+        self.tools.close()
 
     def main(self, taskList):
         for task in taskList:
@@ -370,9 +470,14 @@ class MCCAA(object):
                 logger.error(f"执行任务 {task} 时发生错误: {str(e)}")
                 traceback.print_exc()
                 # 执行debugOcr进行调试
-                debugOcr()
+                debugOcr(self.tools)
                 # 重新抛出异常以便上层处理
                 raise
+        # 任务之间不再各自回主页，全部结束后回到主页
+        try:
+            self.navigator.goto("home")
+        except ValueError as e:
+            logger.warning(f"返回主页失败: {e}")
 
 
 if __name__ == "__main__":
@@ -386,12 +491,15 @@ if __name__ == "__main__":
         exit(1)
     
     # 执行游戏任务
+    mccaa = MCCAA(capture=device_manager.create_capture(), input_channel=device_manager.create_input())
     try:
-        MCCAA().main(taskList)
+        mccaa.main(taskList)
     except Exception as e:
+        # 出错现场已由MCCAA.main保存并打印
         logger.error(f"执行任务时发生错误: {e}")
-        debugOcr()
         traceback.print_exc()
+    finally:
+        mccaa.close()
 
     # debugOcr()
     # data = Tools().get_ocr_cropped_result(cropped=[1022, 150, 82, 23])[0]
@@ -0,0 +1,240 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from templates import build_pyramid
+
+
+class Match(namedtuple("Match", ["name", "x", "y", "w", "h", "score"])):
+    """
+    模板匹配结果：左上角坐标(x, y)、模板尺寸(w, h)与匹配得分
+    """
+    __slots__ = ()
+
+    @property
+    def center(self):
+        """
+        :return: 匹配区域的中心坐标
+        """
+        return self.x + self.w / 2, self.y + self.h / 2
+
+
+def match_best(frame, template, threshold=0.7):
+    """
+    在整帧上匹配模板，返回得分最高的位置
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param template: TemplateImage
+    :param threshold: 匹配阈值（0-1），默认0.7
+    :return: Match，得分不超过阈值时返回None
+    """
+    result = cv2.matchTemplate(frame, template.color, cv2.TM_CCOEFF_NORMED)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    if max_val > threshold:
+        w, h = template.size
+        return Match(template.name, max_loc[0], max_loc[1], w, h, float(max_val))
+    return None
+
+
+def frame_pyramid(frame, levels=3):
+    """
+    构建屏幕帧的灰度金字塔，同一帧匹配多个模板时只需计算一次
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param levels: 最多层数（包含原图），默认3
+    :return: 金字塔列表，第0层为原始灰度图
+    """
+    return build_pyramid(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), levels)
+
+
+def pyramid_level(template, min_size=12, max_level=2):
+    """
+    选择粗匹配使用的金字塔层：模板缩小后最短边不小于min_size的最深一层
+
+    :param template: TemplateImage
+    :param min_size: 粗匹配时模板最短边下限（像素），默认12
+    :param max_level: 最深层数，默认2
+    :return: 层号，0表示不缩小
+    """
+    level = 0
+    while (level < max_level and level + 1 < len(template.pyramid)
+           and min(template.pyramid[level + 1].shape[:2]) >= min_size):
+        level += 1
+    return level
+
+
+def top_peaks(result, count, min_score, size):
+    """
+    从匹配响应图中依次取出得分最高的若干个峰值，每取一个就把它附近的区域抑制掉
+
+    :param result: cv2.matchTemplate的响应图（会被修改）
+    :param count: 最多取几个峰值
+    :param min_score: 峰值得分下限
+    :param size: 抑制区域尺寸（宽, 高）
+    :return: [(得分, (x, y)), ...]，按得分从高到低排列
+    """
+    peaks = list()
+    w, h = size
+    for _ in range(count):
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if max_val < min_score:
+            break
+        peaks.append((max_val, max_loc))
+        x, y = max_loc
+        result[max(y - h // 2, 0):y + h // 2 + 1, max(x - w // 2, 0):x + w // 2 + 1] = -1
+    return peaks
+
+
+def match_pyramid(frame, template, threshold=0.7, pyramid=None, candidates=3, coarse_margin=0.2):
+    """
+    由粗到细的模板匹配：先在缩小的灰度图上找候选位置，再只在候选位置附近做原尺寸精匹配，
+    第一个精匹配得分超过阈值的候选直接返回。模板颜色不明显时精匹配也使用灰度图。
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param template: TemplateImage
+    :param threshold: 匹配阈值（0-1），默认0.7
+    :param pyramid: 屏幕帧的灰度金字塔（可选），为None时现算
+    :param candidates: 粗匹配保留的候选数量，默认3
+    :param coarse_margin: 粗匹配阈值相对于threshold的放宽量，默认0.2
+    :return: Match，未找到返回None
+    """
+    if pyramid is None:
+        pyramid = frame_pyramid(frame)
+    level = min(pyramid_level(template), len(pyramid) - 1)
+    if level == 0:
+        return match_best(frame, template, threshold)
+
+    scale = 2 ** level
+    coarse_template = template.pyramid[level]
+    coarse = cv2.matchTemplate(pyramid[level], coarse_template, cv2.TM_CCOEFF_NORMED)
+    peaks = top_peaks(coarse, candidates, threshold - coarse_margin,
+                      (coarse_template.shape[1], coarse_template.shape[0]))
+
+    if template.colorful:
+        source, needle = frame, template.color
+    else:
+        source, needle = pyramid[0], template.gray
+    w, h = template.size
+    for _, (cx, cy) in peaks:
+        # 在候选位置附近留出缩放带来的误差
+        x1, y1 = max(cx * scale - scale, 0), max(cy * scale - scale, 0)
+        x2 = min(cx * scale + w + scale, source.shape[1])
+        y2 = min(cy * scale + h + scale, source.shape[0])
+        if x2 - x1 < w or y2 - y1 < h:
+            continue
+        fine = cv2.matchTemplate(source[y1:y2, x1:x2], needle, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(fine)
+        if max_val > threshold:
+            return Match(template.name, x1 + max_loc[0], y1 + max_loc[1], w, h, float(max_val))
+    return None
+
+
+def nms(boxes, scores, overlap=0.3):
+    """
+    非极大值抑制
+
+    :param boxes: 矩形框数组，形状(N, 4)，每行为(x, y, w, h)
+    :param scores: 得分数组，形状(N,)
+    :param overlap: 交并比超过该值的框只保留得分最高的一个，默认0.3
+    :return: 保留下来的下标数组（按得分从高到低）
+    """
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-scores)
+    keep = list()
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= overlap]
+    return np.array(keep, dtype=int)
+
+
+def sort_matches(matches, sort="position"):
+    """
+    对匹配结果排序
+
+    :param matches: Match列表
+    :param sort: 排序方式：position（先按行从上到下，再从左到右）、x、y、score（得分从高到低）
+    :return: 排序后的Match列表
+    """
+    if sort == "score":
+        return sorted(matches, key=lambda m: -m.score)
+    if sort == "x":
+        return sorted(matches, key=lambda m: (m.x, m.y))
+    if sort == "y":
+        return sorted(matches, key=lambda m: (m.y, m.x))
+    if sort == "position":
+        # 纵向相差不到半个模板高度的视为同一行
+        return sorted(matches, key=lambda m: (round(m.y / max(m.h / 2, 1)), m.x))
+    raise ValueError(f"不支持的排序方式: {sort}")
+
+
+def match_all(frame, template, threshold=0.7, overlap=0.3, max_results=100, sort="position"):
+    """
+    找出画面中所有与模板匹配的位置（多实例检测）
+
+    先在响应图上用膨胀找出局部极大值，再做非极大值抑制去掉重叠的结果。
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param template: TemplateImage
+    :param threshold: 匹配阈值（0-1），默认0.7
+    :param overlap: 非极大值抑制的交并比阈值，默认0.3
+    :param max_results: 最多返回的结果数，默认100
+    :param sort: 排序方式，见sort_matches，默认position
+    :return: Match列表，可通过Match.center获取中心坐标
+    """
+    if template.colorful:
+        result = cv2.matchTemplate(frame, template.color, cv2.TM_CCOEFF_NORMED)
+    else:
+        result = cv2.matchTemplate(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), template.gray, cv2.TM_CCOEFF_NORMED)
+    w, h = template.size
+    # 局部极大值：等于邻域（半个模板大小）内最大值的点
+    kernel = np.ones((max(h // 2, 1), max(w // 2, 1)), dtype=np.uint8)
+    peaks = (result >= cv2.dilate(result, kernel)) & (result > threshold)
+    ys, xs = np.nonzero(peaks)
+    if not len(xs):
+        return list()
+    scores = result[ys, xs]
+    boxes = np.stack([xs, ys, np.full_like(xs, w), np.full_like(xs, h)], axis=1).astype(np.float32)
+    keep = nms(boxes, scores, overlap)[:max_results]
+    matches = [Match(template.name, int(xs[i]), int(ys[i]), w, h, float(scores[i])) for i in keep]
+    return sort_matches(matches, sort)
+
+
+def match_many(frame, templates, threshold=0.7, executor=None, pyramid=False):
+    """
+    用同一帧一次性匹配多个模板
+
+    :param frame: 屏幕图像（numpy数组，BGR格式）
+    :param templates: TemplateImage列表
+    :param threshold: 匹配阈值（0-1），也可以是{模板名称: 阈值}的字典
+    :param executor: 线程池（可选），OpenCV匹配时会释放GIL，多个模板可并行匹配
+    :param pyramid: 是否使用由粗到细的金字塔匹配，默认False
+    :return: 所有命中的模板 {模板名称: Match}
+    """
+    frame_pyr = frame_pyramid(frame) if pyramid else None
+
+    def job(template):
+        if isinstance(threshold, dict):
+            value = threshold.get(template.name, 0.7)
+        else:
+            value = threshold
+        if pyramid:
+            return match_pyramid(frame, template, value, frame_pyr)
+        return match_best(frame, template, value)
+
+    if executor is None or len(templates) < 2:
+        matches = [job(template) for template in templates]
+    else:
+        matches = list(executor.map(job, templates))
+    return {match.name: match for match in matches if match}
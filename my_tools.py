@@ -1,235 +1,609 @@
-import cv2
-
 import re
 import threading
 import time
 import traceback
 from concurrent.futures import ThreadPoolExecutor
 
-import Levenshtein
-from airtest.core.api import snapshot, touch, sleep, click, wait, Template, G, connect_device, ST, start_app, stop_app
+from airtest.core.api import touch, sleep, click, wait, Template, G, connect_device, ST, start_app, stop_app
 from loguru import logger
-from paddleocr import PaddleOCR
-from PIL import Image
+
+from adb import AdbError
+from digits import DigitReader
+from location_memory import LOCATIONS_PATH, LocationMemory
+from capture import AirtestCapture, FrameChangeDetector, PipelinedCapture, crop
+from ocr_cache import OCR_CACHE_PATH, FrameOcrCache, PersistentOcrCache, frame_key
+from ocr_engine import BACKEND_LOCAL, get_registry
+from ocr_result import OcrResult
+from matcher import match_all, match_best, match_many, match_pyramid
+from templates import TemplateLibrary
+from scenes import Reroute
+from text_match import best_matches, parse_target
+
+
+def offset_ocr_result(ocr_result, dx, dy):
+    """
+    将裁剪图上的OCR结果坐标平移回整屏坐标
+
+    :param ocr_result: PaddleOCR原始识别结果
+    :param dx: 裁剪区域左上角x坐标
+    :param dy: 裁剪区域左上角y坐标
+    :return: 坐标平移后的识别结果（结构与PaddleOCR原始结果一致）
+    """
+    result = list()
+    for line in ocr_result or list():
+        result.append([
+            [[[x + dx, y + dy] for x, y in word_info[0]], word_info[1]]
+            for word_info in line or list()
+        ])
+    return result
 
 
 class Tools(object):
-    def __init__(self):
+    def __init__(self, dump_dir=None, ocr=None, ocr_backend=BACKEND_LOCAL, capture=None, input_channel=None,
+                 ocr_cache_path=OCR_CACHE_PATH, locations_path=LOCATIONS_PATH):
         """
         初始化工具类，包含OCR实例和线程锁
 
+        :param dump_dir: 调试用的截图保存目录，为None时截图只在内存中流转
+        :param ocr: OCR引擎，为None时从进程内的引擎注册表获取共享引擎（用完调用close归还）
+        :param ocr_backend: 共享引擎的运行方式，local在当前进程内识别，process在独立的工作进程中识别
+        :param capture: 截图采集器，为None时使用AirtestCapture
+        :param input_channel: 设备输入通道（InputChannel），用于连续点击多个点，为None时全部使用airtest的touch点击
+        :param ocr_cache_path: 持久化OCR缓存的路径，为None或OCR引擎没有配置指纹时不使用
+        :param locations_path: 文字位置记忆的保存路径，为None时只保存在内存中
+
         Attributes:
             sings: 用于同步的信号量
-            ocr: PaddleOCR实例，用于文字识别
+            ocr: OCR引擎（接口与PaddleOCR一致），第一次识别时才加载模型
             lock: 线程锁，用于同步操作
+            capture: 截图采集器，直接返回内存中的屏幕帧
+            input: 设备输入通道，多个点的连续点击一次发送到设备端执行（单次点击仍用airtest）
+            ocr_cache: 以帧内容为键的OCR结果缓存，同一画面的多次文字查询只识别一次
+            persistent_cache: 跨运行持久化的OCR结果缓存（按画面感知签名查找），固定画面不再重复识别
+            recheck_interval: 画面静止时强制重新检测的间隔（秒）
+            pipelined: wait_screen是否使用流水线截图（识别当前帧时后台截取下一帧）
+            guard: 步骤前置条件检查（如SceneGuard），wait_screen在目标未出现时用当前帧调用，可以抛出异常提前结束等待，
+                   或抛出Reroute先导航再继续等待；
+                   guard.pending为True时画面静止也会调用
+            templates: 预加载的模板图片库
+            executor: 多模板并行匹配用的线程池
+            digits: 数字识别器，读取小区域内的数字时先用它，不可靠时才用PaddleOCR
+            scene: 最近一次识别出的界面（SceneClassifier识别后更新，点击后保持不变），作为文字位置记忆的分组
+            locations: 文字位置记忆，查找文字时先只识别上次的位置，识别不到才做整屏检测
         """
         self.sings = None
-        self.ocr = PaddleOCR(use_angle_cls=True, lang="ch")
+        self._shared_ocr = ocr is None
+        self.ocr = get_registry().acquire(backend=ocr_backend) if ocr is None else ocr
         self.lock = threading.Lock()
+        self.capture = capture or AirtestCapture(dump_dir=dump_dir)
+        self.input = input_channel
+        self.ocr_cache = FrameOcrCache()
+        self.persistent_cache = None
+        fingerprint = getattr(self.ocr, "fingerprint", None)
+        if ocr_cache_path and fingerprint:
+            try:
+                self.persistent_cache = PersistentOcrCache(fingerprint, ocr_cache_path)
+            except Exception as e:
+                logger.warning(f"持久化OCR缓存打开失败: {e}")
+        self.recheck_interval = 5
+        self.pipelined = True
+        self.guard = None
+        self.templates = TemplateLibrary("images", pack_path="images/templates.pack")
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.digits = DigitReader()
+        self.scene = None
+        self.locations = LocationMemory(locations_path)
+
+    def close(self):
+        """
+        归还共享的OCR引擎，关闭截图连接、输入通道、持久化缓存和线程池，保存文字位置记忆
+        """
+        self.capture.close()
+        if self.persistent_cache is not None:
+            self.persistent_cache.close()
+            self.persistent_cache = None
+        self.locations.save()
+        if self.input is not None:
+            self.input.close()
+        if self._shared_ocr and self.ocr is not None:
+            get_registry().release(self.ocr)
+            self.ocr = None
+        self.executor.shutdown(wait=False)
+
+    def tap(self, point):
+        """
+        点击一个坐标。单次点击使用airtest的touch（minitouch/maxtouch长连接），
+        比在设备shell中启动一次input命令快得多
+
+        :param point: 坐标 (x, y)
+        """
+        touch(tuple(point[:2]))
+
+    def tap_batch(self, points, delay=0.1):
+        """
+        依次点击多个坐标。有输入通道且不止一个点时整串点击在设备端执行，只需一次往返；
+        否则（或输入通道不可用时）用airtest逐个点击
+
+        :param points: 坐标列表，元素为(x, y)，或(x, y, 点击后的等待秒数)
+        :param delay: 相邻两次点击之间的默认间隔（秒），默认0.1秒
+        """
+        if self.input is not None and len(points) > 1:
+            try:
+                self.input.tap_batch(points, delay)
+                return
+            except (AdbError, OSError) as e:
+                logger.warning(f"输入通道不可用，改用airtest点击: {e}")
+        for i, point in enumerate(points):
+            if i:
+                sleep(pause)
+            self.tap(point)
+            pause = point[2] if len(point) > 2 else delay
+
+    def wait_settle(self, timeout=1.0, interval=0.05, stable_frames=2, expect_change=False, change_timeout=0.5,
+                    roi=None):
+        """
+        等待画面稳定（动画结束）：连续stable_frames帧缩略图没有变化即返回，最多等待timeout秒
+
+        :param timeout: 最长等待时间（秒），默认1秒，为0时立即返回
+        :param interval: 截图间隔（秒），默认0.05秒
+        :param stable_frames: 连续多少帧没有变化认为画面已稳定，默认2
+        :param expect_change: 是否先等待画面开始变化（刚点击后画面可能还没来得及响应），默认False
+        :param change_timeout: expect_change时等待画面开始变化的最长时间（秒），超过后认为操作没有动画，默认0.5秒
+        :param roi: 只关注的区域 [x1, y1, width, height]，为None时关注整屏
+        :return: 实际等待的时间（秒）
+        """
+        start_time = time.time()
+        if timeout <= 0:
+            return 0.0
+        detector = FrameChangeDetector()
+        frame = self.get_screen()
+        if frame is not None:
+            detector.changed(crop(frame, roi))
+        changed = not expect_change
+        stable = 0
+        while time.time() - start_time < timeout:
+            time.sleep(interval)
+            frame = self.get_screen()
+            if frame is None:
+                continue
+            if detector.changed(crop(frame, roi)):
+                changed = True
+                stable = 0
+            elif changed or time.time() - start_time >= change_timeout:
+                changed = True
+                stable += 1
+                if stable >= stable_frames:
+                    break
+        elapsed = time.time() - start_time
+        logger.debug(f"画面稳定耗时: {elapsed:.2f}秒")
+        return elapsed
+
+    def tap_settle(self, point, timeout=2.0):
+        """
+        点击后等待画面稳定
+
+        :param point: 坐标 (x, y)
+        :param timeout: 最长等待时间（秒），默认2秒
+        :return: 实际等待的时间（秒）
+        """
+        self.tap(point)
+        return self.wait_settle(timeout, expect_change=True)
+
+    def get_screen(self, save_path=None):
+        """
+        获取当前屏幕帧（numpy数组，BGR格式），不经过磁盘
+
+        :param save_path: 需要调试时传入保存路径，会额外把截图写到磁盘
+        :return: 屏幕图像，获取失败返回None
+        """
+        frame = self.capture.grab()
+        if save_path:
+            self.capture.save(frame, save_path)
+        return frame
+
+    def ocr_frame(self, frame, roi=None):
+        """
+        对内存中的屏幕帧进行OCR识别
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏；只在内存中裁剪，返回的坐标已换算回整屏坐标
+        :return: PaddleOCR原始识别结果，帧为空时返回空列表
+        """
+        if frame is None:
+            return list()
+        image = crop(frame, roi)
+        key = frame_key(image, roi and tuple(roi))
+        ocr_result = self.ocr_cache.get(key)
+        if ocr_result is not None:
+            return ocr_result
+        signature = None
+        if self.persistent_cache is not None:
+            signature = self.persistent_cache.signature(image)
+            ocr_result = self.persistent_cache.get(signature, roi)
+        if ocr_result is None:
+            ocr_result = self.ocr.ocr(image, cls=True)
+            if roi:
+                ocr_result = offset_ocr_result(ocr_result, roi[0], roi[1])
+            if signature is not None:
+                self.persistent_cache.put(signature, roi, ocr_result)
+        self.ocr_cache.put(key, ocr_result)
+        return ocr_result
+
+    def ocr_result(self, frame, roi=None):
+        """
+        获取一帧画面的结构化OCR结果（带空间索引，支持区域查询和相对位置查询）
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: OcrResult
+        """
+        return OcrResult.from_paddle(self.ocr_frame(frame, roi))
+
+    def search_txt(self, frame, match, roi=None):
+        """
+        在一帧画面的OCR结果中查找第一个满足条件的文本
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param match: 判断函数，参数为识别出的文字，返回是否匹配
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: 匹配文本的中心坐标（元组形式），未找到返回None
+        """
+        for line in self.ocr_frame(frame, roi) or list():
+            for word_info in line or list():
+                # 获取识别结果的文字信息
+                textinfo = word_info[1][0]
+                if match(textinfo):
+                    # 获取文字的坐标（中心点）
+                    x1, y1 = word_info[0][0]
+                    x2, y2 = word_info[0][2]
+                    return (x1 + x2) / 2, (y1 + y2) / 2
+        return None
+
+    def ocr_boxes(self, frame, roi=None):
+        """
+        获取一帧画面中所有识别到的文本框
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: [(文字, 中心坐标, 置信度), ...]
+        """
+        boxes = list()
+        for line in self.ocr_frame(frame, roi) or list():
+            for word_info in line or list():
+                x1, y1 = word_info[0][0]
+                x2, y2 = word_info[0][2]
+                boxes.append((word_info[1][0], ((x1 + x2) / 2, (y1 + y2) / 2), word_info[1][1]))
+        return boxes
+
+    def read_numbers(self, frame, roi=None):
+        """
+        读取区域内的所有数字（每行一个数字）。先用轻量数字识别器，有任何一行不可靠时改用PaddleOCR，
+        并用PaddleOCR的结果学习字形，之后同样的数字不再需要OCR
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: [(数字, 中心坐标), ...]，按从上到下排列
+        """
+        if frame is None:
+            return list()
+        image = crop(frame, roi)
+        dx, dy = (roi[0], roi[1]) if roi else (0, 0)
+        lines = self.digits.read(image)
+        if self.digits.confident(lines):
+            return [(int(text), (dx + (x1 + x2) / 2, dy + (y1 + y2) / 2)) for text, _, (x1, y1, x2, y2) in lines]
+        numbers = list()
+        for text, coords, _ in sorted(self.ocr_boxes(frame, roi), key=lambda box: box[1][1]):
+            digits = re.sub(r"\D", "", text)
+            if digits:
+                numbers.append((digits, coords))
+        if numbers and self.digits.learn(image, [digits for digits, _ in numbers]):
+            logger.debug(f"数字字形库已更新: {[digits for digits, _ in numbers]}")
+        return [(int(digits), coords) for digits, coords in numbers]
+
+    def recognize_box(self, frame, box, padding=4, widen=2.0, limits=None):
+        """
+        只对一个文本框做文字识别（跳过文字检测）。识别区域横向加宽，文本框位置上换成了更长的文字时
+        （如原来的"任务"变成"每日任务"）会识别出完整的文字，精确匹配不会误判。
+        加宽不会越过同一行左右相邻的文本框（如"周常"旁边的"日常"），避免把邻近的标签识别进来
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param box: 文本框 (x1, y1, x2, y2)
+        :param padding: 文本框向外扩展的像素数，默认4
+        :param widen: 横向每侧扩展的宽度（文本框高度的倍数，约等于几个汉字），默认2
+        :param limits: 横向加宽的边界 (左侧相邻文本框的右边, 右侧相邻文本框的左边)，为None或某一侧为None时不限
+        :return: [(文字, 置信度), ...]
+        """
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = (int(value) for value in box)
+        left, right = limits or (None, None)
+        margin = max(padding, int((y2 - y1) * widen))
+        # 相邻文本框的检测框可能与目标有几个像素的重叠，边界不会缩进目标文本框内
+        left = x1 - margin if left is None else max(x1 - margin, min(int(left), x1))
+        right = x2 + margin if right is None else min(x2 + margin, max(int(right), x2))
+        x1, y1 = max(left, 0), max(y1 - padding, 0)
+        x2, y2 = min(right, width), min(y2 + padding, height)
+        if x2 <= x1 or y2 <= y1:
+            return list()
+        ocr_result = self.ocr.ocr(frame[y1:y2, x1:x2], det=False, cls=False)
+        # 不同版本的PaddleOCR对单张图片返回[(文字, 置信度)]或[[(文字, 置信度)]]
+        lines = list()
+        for item in ocr_result or list():
+            for line in (item if item and isinstance(item[0], (list, tuple)) else [item]):
+                if line and isinstance(line[0], str):
+                    lines.append((line[0], line[1]))
+        return lines
+
+    def locate_txt(self, frame, target_text, match, roi=None, min_score=0.5):
+        """
+        查找目标文本：先用文字位置记忆中（当前界面的）文本框做一次只识别不检测的验证，失败时才整屏检测，
+        并记住新的位置和同一行左右相邻文本框的位置（验证时识别区域的加宽边界）。
+        还没有识别过界面时记在未知界面分组下
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param target_text: 目标文本（位置记忆的键）
+        :param match: 判断函数，参数为识别出的文字，返回是否匹配
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :param min_score: 验证时识别结果的最低置信度，默认0.5
+        :return: 匹配文本的中心坐标（元组形式），未找到返回None
+        """
+        if frame is None:
+            return None
+        location = self.locations.get(self.scene, target_text)
+        if location is not None:
+            box, limits = location[:4], location[4:] or None
+            if roi is None or (roi[0] <= box[0] and roi[1] <= box[1]
+                               and box[2] <= roi[0] + roi[2] and box[3] <= roi[1] + roi[3]):
+                if any(match(text) and score >= min_score
+                       for text, score in self.recognize_box(frame, box, limits=limits)):
+                    self.locations.hits += 1
+                    return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+                self.locations.misses += 1
+        result = self.ocr_result(frame, roi)
+        for found in result:
+            if match(found.text):
+                left = result.nearest_left(found)
+                right = result.nearest_right(found)
+                self.locations.put(self.scene, target_text, (found.x1, found.y1, found.x2, found.y2),
+                                   (left.x2 if left else None, right.x1 if right else None))
+                return found.center
+        return None
+
+    def search_txt_le(self, frame, target_text, ratio=0.7, roi=None):
+        """
+        在一帧画面的所有文本框中找出与目标文本相似度最高的一个
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param target_text: 目标文本
+        :param ratio: 相似度阈值（0-1），默认0.7
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: 相似度最高的文本中心坐标，没有达到阈值的返回None
+        """
+        boxes = self.ocr_boxes(frame, roi)
+        best = best_matches([target_text], [box[0] for box in boxes], ratio)[0]
+        if best:
+            return boxes[best[0]][1]
+        return None
+
+    def wait_screen(self, detect, timeout=10, interval=0.1, max_interval=1.0, roi=None):
+        """
+        轮询屏幕直到detect返回真值
+
+        画面与上一次检测时相比没有变化时跳过detect，并把轮询间隔逐步翻倍到max_interval；
+        画面发生变化后间隔恢复为interval。每隔recheck_interval秒即使画面不变也会强制检测一次。
+        pipelined为True时截图在后台线程中进行，detect执行期间下一帧已经截好，总是检测最新的一帧。
+        guard抛出Reroute时先结束后台截图，导航完成后在剩余的超时时间内继续等待。
+
+        :param detect: 检测函数，参数为屏幕帧，返回检测结果
+        :param timeout: 超时时间（秒），默认10秒
+        :param interval: 最短轮询间隔（秒），默认0.1秒
+        :param max_interval: 画面静止时的最长轮询间隔（秒），默认1秒
+        :param roi: 只关注的区域 [x1, y1, width, height]，区域外的变化不会触发检测
+        :return: detect的返回值，超时返回False
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return self._wait_screen_once(detect, max(deadline - time.time(), 0), interval, max_interval, roi)
+            except Reroute as reroute:
+                # 已离开流水线截图，导航占用的是调用方剩余的超时时间
+                if time.time() >= deadline:
+                    return False
+                logger.warning(f"{reroute}")
+                reroute.navigate(deadline - time.time())
+
+    def _wait_screen_once(self, detect, timeout, interval, max_interval, roi):
+        if not self.pipelined:
+            return self._wait_screen(self.get_screen, detect, timeout, interval, max_interval, roi)
+        with PipelinedCapture(self.capture, min_interval=interval) as pipeline:
+            start_time = time.time()
+            return self._wait_screen(lambda: pipeline.grab(max(timeout - (time.time() - start_time), 0.1)),
+                                     detect, timeout, interval, max_interval, roi, pipelined=True)
+
+    def _wait_screen(self, grab, detect, timeout, interval, max_interval, roi, pipelined=False):
+        detector = FrameChangeDetector()
+        start_time = time.time()
+        last_detect = 0
+        delay = interval
+        while True:
+            if self.sings:
+                return False
+            frame = grab()
+            if frame is not None and (detector.changed(crop(frame, roi)) or
+                                      time.time() - last_detect >= self.recheck_interval):
+                last_detect = time.time()
+                result = detect(frame)
+                if result:
+                    return result
+                if self.guard is not None:
+                    self.guard(frame)
+                delay = interval
+                if pipelined:
+                    # 下一帧已经在后台截取，grab会等待新帧，不需要再休眠
+                    delay = 0
+            else:
+                # 画面静止，退避
+                delay = min(max(delay, interval) * 2, max_interval)
+                if frame is not None and self.guard is not None and self.guard.pending:
+                    # 已经发现错误界面，画面静止时也要继续确认，不等强制重新检测
+                    self.guard(frame)
+            if time.time() - start_time >= timeout:
+                return False
+            if delay:
+                time.sleep(delay)
 
-    def exists_txt(self, target_text, timeout=10):
+    def exists_txt(self, target_text, timeout=10, roi=None):
         """
         判断目标文本是否存在于当前屏幕中，并返回其中心坐标
 
         :param target_text: 要检测的目标文本内容
         :param timeout: 检测超时时间（秒），默认10秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         :return: 目标文本的中心坐标（元组形式），若超时未找到则返回False
         """
-        startTime = time.time()
         logger.debug(f"判断: {target_text}")
-        while True:
-            pic_path = r"images/now.png"
-            snapshot(pic_path)
-            ocr_result = self.ocr.ocr(pic_path, cls=True)
-            for line in ocr_result or list():
-                for word_info in line or list():
-                    # 获取识别结果的文字信息
-                    textinfo = word_info[1][0]
-                    if target_text == textinfo:
-                        # 获取文字的坐标（中心点）
-                        x1, y1 = word_info[0][0]
-                        x2, y2 = word_info[0][2]
-                        target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                        return target_coords
-            endTime = time.time()
-            if endTime - startTime >= timeout:
-                return False
+        return self.wait_screen(lambda frame: self.locate_txt(frame, target_text, lambda textinfo: target_text == textinfo, roi), timeout, roi=roi)
 
-    def exists_ocr(self, target_text, timeout=10):
+    def exists_ocr(self, target_text, timeout=10, roi=None):
         """
         判断目标文本是否存在于当前屏幕中，并返回其中心坐标
 
         :param target_text: 要检测的目标文本内容
         :param timeout: 检测超时时间（秒），默认10秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         :return: 目标文本的中心坐标（元组形式），若超时未找到则返回False
         """
-        startTime = time.time()
         logger.debug(f"判断: {target_text}")
-        while True:
-            pic_path = r"images/now.png"
-            snapshot(pic_path)
-            ocr_result = self.ocr.ocr(pic_path, cls=True)
-            for line in ocr_result or list():
-                for word_info in line or list():
-                    # 获取识别结果的文字信息
-                    textinfo = word_info[1][0]
-                    if target_text in textinfo:
-                        # 获取文字的坐标（中心点）
-                        x1, y1 = word_info[0][0]
-                        x2, y2 = word_info[0][2]
-                        target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                        return target_coords
-            endTime = time.time()
-            if endTime - startTime >= timeout:
-                return False
+        return self.wait_screen(lambda frame: self.locate_txt(frame, target_text, lambda textinfo: target_text in textinfo, roi), timeout, roi=roi)
 
-    def exists_txt_le(self, target_text, timeout=10, ratio=0.7):
+    def exists_txt_le(self, target_text, timeout=10, ratio=0.7, roi=None):
         """
-        通过Levenshtein相似度模糊匹配目标文本是否存在，并返回其中心坐标
+        通过Levenshtein相似度模糊匹配目标文本是否存在，并返回相似度最高的文本的中心坐标
 
         :param target_text: 要检测的目标文本内容
         :param timeout: 检测超时时间（秒），默认10秒
         :param ratio: 相似度阈值（0-1），默认0.7
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         :return: 目标文本的中心坐标（元组形式），若超时未找到则返回False
         """
-        startTime = time.time()
         logger.debug(f"判断: {target_text}")
-        while True:
-            pic_path = r"images/now.png"
-            snapshot(pic_path)
-            ocr_result = self.ocr.ocr(pic_path, cls=True)
-            for line in ocr_result or list():
-                for word_info in line or list():
-                    # 获取识别结果的文字信息
-                    textinfo = word_info[1][0]
-                    if Levenshtein.ratio(target_text, textinfo) >= ratio:
-                        # 获取文字的坐标（中心点）
-                        x1, y1 = word_info[0][0]
-                        x2, y2 = word_info[0][2]
-                        target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                        return target_coords
-            endTime = time.time()
-            if endTime - startTime >= timeout:
-                return False
+        return self.wait_screen(lambda frame: self.search_txt_le(frame, target_text, ratio, roi), timeout, roi=roi)
+
+    def search_any_txt(self, frame, targets, roi=None):
+        """
+        用同一帧的OCR结果同时匹配多个目标文本
+
+        :param frame: 屏幕图像（numpy数组，BGR格式）
+        :param targets: 目标列表，元素为文本（精确匹配）或元组(文本, 匹配方式[, 相似度阈值])，
+                        匹配方式：txt精确匹配、ocr包含匹配、le Levenshtein模糊匹配（默认阈值0.7）
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: (命中的目标文本, 中心坐标)，多个目标同时命中时按targets中的顺序取第一个；未命中返回None
+        """
+        targets = [parse_target(target) for target in targets]
+        boxes = self.ocr_boxes(frame, roi)
+        texts = [box[0] for box in boxes]
+        # 模糊匹配的目标一次性算出相似度矩阵
+        fuzzy = [index for index, (_, mode, _) in enumerate(targets) if mode == "le"]
+        fuzzy_best = best_matches([targets[i][0] for i in fuzzy], texts, [targets[i][2] for i in fuzzy])
+        fuzzy_best = dict(zip(fuzzy, fuzzy_best))
+        for index, (target_text, mode, ratio) in enumerate(targets):
+            if mode == "le":
+                if fuzzy_best[index]:
+                    return target_text, boxes[fuzzy_best[index][0]][1]
+                continue
+            for textinfo, coords, _ in boxes:
+                if (mode == "txt" and target_text == textinfo) or (mode == "ocr" and target_text in textinfo):
+                    return target_text, coords
+        return None
+
+    def exists_any_txt(self, targets, timeout=10, roi=None):
+        """
+        等待多个目标文本中的任意一个出现，每次OCR同时检查所有目标
+
+        :param targets: 目标列表，格式见search_any_txt
+        :param timeout: 检测超时时间（秒），默认10秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :return: (命中的目标文本, 中心坐标)，若超时未找到则返回False
+        """
+        logger.debug(f"判断: {targets}")
+        return self.wait_screen(lambda frame: self.search_any_txt(frame, targets, roi), timeout, roi=roi)
 
     def click_number(self):
         """
         检测到"请选择宝物"文本后，点击屏幕中三位数的文本内容
         """
         logger.debug("点击数字")
-        _click = False
-        pic_path = r"images/now.png"
-        snapshot(pic_path)
-        ocr_result = self.ocr.ocr(pic_path, cls=True)
-        for line in ocr_result:
-            for word_info in line:
-                textinfo = word_info[1][0]
-                number = re.search("\d\d\d", textinfo)
-                if number and _click:
-                    # 获取文字的坐标（中心点）
-                    x1, y1 = word_info[0][0]
-                    x2, y2 = word_info[0][2]
-                    target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                    touch(target_coords)
-                    sleep(2)
-                elif "请选择宝物" in textinfo:
-                    _click = True
-                else:
-                    continue
-
-    def ocr_touch(self, target_text, click_timeout=0.5):
+        result = self.ocr_result(self.get_screen())
+        labels = result.find("请选择宝物", "ocr")
+        if not labels:
+            return
+        # 提示文字下方的所有三位数，按位置从上到下、从左到右
+        points = [box.center for box in result.numbers(result.below(labels[0]), min_digits=3)]
+        if points:
+            # 第一次点击后测量画面稳定耗时，剩下的数字按这个间隔一次发送到设备端依次点击
+            self.tap(points[0])
+            delay = self.wait_settle(2, expect_change=True)
+            if len(points) > 1:
+                self.tap_batch(points[1:], delay=delay)
+                self.wait_settle(2, expect_change=True)
+
+    def ocr_touch(self, target_text, click_timeout=0.5, roi=None):
         """
         精确匹配目标文本并点击其中心坐标
 
         :param target_text: 要点击的目标文本内容
-        :param click_timeout: 点击前等待时间（秒），默认0.5秒
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0.5秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         :return: 目标文本的中心坐标（元组形式）
         :raises ValueError: 未找到目标文本时抛出异常
         """
         logger.debug(f"准备点击: {target_text}")
-        pic_path = r"images/now.png"
-        snapshot(pic_path)
-        ocr_result = self.ocr.ocr(pic_path, cls=True)
-        target_coords = None
-        for line in ocr_result or []:
-            for word_info in line:
-                # 获取识别结果的文字信息
-                textinfo = word_info[1][0]
-                if target_text == textinfo:
-                    # 获取文字的坐标（中心点）
-                    x1, y1 = word_info[0][0]
-                    x2, y2 = word_info[0][2]
-                    target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                    break
-            if target_coords:
-                break
+        frame = self.get_screen()
+        target_coords = self.locate_txt(frame, target_text, lambda textinfo: target_text == textinfo, roi)
 
         # 点击坐标
         if target_coords:
             logger.debug(f"点击: {target_text} 坐标: {target_coords}")
-            sleep(click_timeout)
-            touch(target_coords)
+            self.wait_settle(click_timeout, roi=roi)
+            self.tap(target_coords)
             return target_coords
         else:
             raise ValueError(f"没识别到: {target_text}")
 
-    def ocr_touch_le(self, target_text, click_timeout=0.5, ratio=0.7):
+    def ocr_touch_le(self, target_text, click_timeout=0.5, ratio=0.7, roi=None):
         """
         模糊匹配目标文本并点击其中心坐标
 
         :param target_text: 要点击的目标文本内容
-        :param click_timeout: 点击前等待时间（秒），默认0.5秒
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0.5秒
         :param ratio: 相似度阈值（0-1），默认0.7
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         :return: 目标文本的中心坐标（元组形式）
         :raises ValueError: 未找到目标文本时抛出异常
         """
         logger.debug(f"准备点击: {target_text}")
-        pic_path = r"images/now.png"
-        snapshot(pic_path)
-        ocr_result = self.ocr.ocr(pic_path, cls=True)
-        target_coords = None
-        for line in ocr_result or []:
-            for word_info in line:
-                # 获取识别结果的文字信息
-                textinfo = word_info[1][0]
-                if Levenshtein.ratio(target_text, textinfo) >= ratio:
-                    # 获取文字的坐标（中心点）
-                    x1, y1 = word_info[0][0]
-                    x2, y2 = word_info[0][2]
-                    target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                    break
-            if target_coords:
-                break
+        frame = self.get_screen()
+        target_coords = self.search_txt_le(frame, target_text, ratio, roi)
 
         # 点击坐标
         if target_coords:
             logger.debug(f"点击: {target_text} 坐标: {target_coords}")
-            sleep(click_timeout)
-            touch(target_coords)
+            self.wait_settle(click_timeout, roi=roi)
+            self.tap(target_coords)
             return target_coords
         else:
             raise ValueError(f"没识别到: {target_text}")
 
-    def get_ocr_result(self):
+    def get_ocr_result(self, roi=None, frame=None):
         """
         获取当前屏幕中所有识别到的文本及其中心坐标
 
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
+        :param frame: 已获取的屏幕帧，为None时重新截图
         :return: 包含文本和对应中心坐标的列表（格式：[{text: (x,y)}]）
         """
-        pic_path = r"images/now.png"
-        snapshot(pic_path)
-        ocr_result = self.ocr.ocr(pic_path, cls=True)
-        result = list()
-        for line in ocr_result:
-            for word_info in line:
-                # 获取识别结果的文字信息
-                textinfo = word_info[1][0]
-
-                x1, y1 = word_info[0][0]
-                x2, y2 = word_info[0][2]
-                target_coords = ((x1 + x2) / 2, (y1 + y2) / 2)
-                result.append({textinfo: target_coords})
-        return result
+        if frame is None:
+            frame = self.get_screen()
+        return [{box.text: box.center} for box in self.ocr_result(frame, roi)]
 
     def get_ocr_cropped_result(self, cropped=None):
         """
@@ -241,73 +615,54 @@ class Tools(object):
         if cropped is None:
             raise ValueError("cropped参数不能为空，需传入[x1, y1, width, height]格式的裁剪区域")
         logger.debug(cropped)
-        pic_path = r"./now.png"
-        snapshot(pic_path)
-        img = Image.open(pic_path)
-        # 裁剪区域：(左, 上, 右, 下) = (x1, y1, x1+width, y1+height)
-        cropped_img = img.crop((cropped[0], cropped[1], cropped[0] + cropped[2], cropped[1] + cropped[3]))
-        cropped_path = r"./cropped_now.png"
-        cropped_img.save(cropped_path)  # 保存裁剪后的图片用于调试
-        # 对裁剪后的图片进行OCR识别
-        ocr_result = self.ocr.ocr(cropped_path, cls=True)
-        result = list()
-        for line in ocr_result:
-            for word_info in line:
-                textinfo = word_info[1][0]
-                # 获取裁剪后图片中的文字坐标（左上角和右下角）
-                x1_cropped, y1_cropped = word_info[0][0]  # 裁剪后图片中的左上角坐标
-                x2_cropped, y2_cropped = word_info[0][2]  # 裁剪后图片中的右下角坐标
+        frame = self.get_screen()
+        if self.capture.dump_dir:
+            # 保存裁剪后的图片用于调试
+            self.capture.save(crop(frame, cropped), r"./cropped_now.png")
+        return self.get_ocr_result(roi=cropped, frame=frame)
 
-                # 计算裁剪后图片中的中心点坐标
-                center_x_cropped = (x1_cropped + x2_cropped) / 2
-                center_y_cropped = (y1_cropped + y2_cropped) / 2
-
-                # 转换为原始大图中的坐标（加上裁剪区域的偏移量）
-                original_x = cropped[0] + center_x_cropped
-                original_y = cropped[1] + center_y_cropped
-
-                result.append({textinfo: (original_x, original_y)})
-        return result
-
-    def click_txt(self, target_text, timeout=10, click_timeout=0.5):
+    def click_txt(self, target_text, timeout=10, click_timeout=0.5, roi=None):
         """
         等待目标文本出现后点击其中心坐标
 
         :param target_text: 要点击的目标文本内容
         :param timeout: 等待超时时间（秒），默认10秒
-        :param click_timeout: 点击前等待时间（秒），默认0.5秒
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0.5秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         """
-        target_coords = self.exists_txt(target_text, timeout)
+        target_coords = self.exists_txt(target_text, timeout, roi)
         if target_coords:
-            sleep(click_timeout)
-            touch(target_coords)
+            self.wait_settle(click_timeout, roi=roi)
+            self.tap(target_coords)
 
-    def click_ocr(self, target_text, timeout=10, click_timeout=0.5):
+    def click_ocr(self, target_text, timeout=10, click_timeout=0.5, roi=None):
         """
         等待目标文本出现后点击其中心坐标
 
         :param target_text: 要点击的目标文本内容
         :param timeout: 等待超时时间（秒），默认10秒
-        :param click_timeout: 点击前等待时间（秒），默认0.5秒
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0.5秒
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         """
-        target_coords = self.exists_ocr(target_text, timeout)
+        target_coords = self.exists_ocr(target_text, timeout, roi)
         if target_coords:
-            sleep(click_timeout)
-            touch(target_coords)
+            self.wait_settle(click_timeout, roi=roi)
+            self.tap(target_coords)
 
-    def click_txt_le(self, target_text, timeout=10, click_timeout=0.5, ratio=0.7):
+    def click_txt_le(self, target_text, timeout=10, click_timeout=0.5, ratio=0.7, roi=None):
         """
         等待模糊匹配的目标文本出现后点击其中心坐标
 
         :param target_text: 要点击的目标文本内容
         :param timeout: 等待超时时间（秒），默认10秒
-        :param click_timeout: 点击前等待时间（秒），默认0.5秒
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0.5秒
         :param ratio: 相似度阈值（0-1），默认0.7
+        :param roi: 识别区域 [x1, y1, width, height]，为None时识别整屏
         """
-        target_coords = self.exists_txt_le(target_text, timeout, ratio)
+        target_coords = self.exists_txt_le(target_text, timeout, ratio, roi)
         if target_coords:
-            sleep(click_timeout)
-            touch(target_coords)
+            self.wait_settle(click_timeout, roi=roi)
+            self.tap(target_coords)
 
     # def wait_image(self, image):
     #     """
@@ -319,83 +674,121 @@ class Tools(object):
     #     result = wait(Template(f"images/{image}.png"), timeout=30)
     #     return result
 
-    def exists_image(self, image, timeout=10, threshold=0.7, interval=0.5, click_timeout=0.5):
+    def exists_image(self, image, timeout=10, threshold=0.7, interval=0.5, click_timeout=0.5, pyramid=True):
         """
-        检测指定图片是否存在并返回其坐标
+        检测指定图片是否存在并返回其中心坐标
 
         :param image: 图片名称（不带扩展名，默认png格式）
         :param timeout: 检测超时时间（秒），默认10秒
         :param threshold: 图片匹配阈值（0-1），默认0.7
-        :param interval: 检测间隔时间（秒），默认0.5秒
+        :param interval: 检测间隔时间（秒），默认0.5秒，画面静止时会逐步拉长到1秒
         :param intervalfunc: 检测间隔执行的函数（可选）
-        :return: 图片在屏幕中的坐标（元组形式），若超时未找到则返回False
+        :param pyramid: 是否使用由粗到细的金字塔匹配（先缩小匹配再在候选位置精匹配），默认True
+        :return: 图片在屏幕中的中心坐标（元组形式），若超时未找到则返回False
         """
         # query = Template(f"images/{image}.png", rgb=True, threshold=threshold)
         logger.debug(f"判断图片{image}是否存在")
-        start_time = time.time()
         if self.sings:
             return False
-        else:
-            while True:
-                if self.sings:
-                    return False
-
-                screen_path = r"./now.png"
-                snapshot(screen_path)
-
-                img1 = cv2.imread(screen_path)
-                img2 = cv2.imread(f'./images/{image}.png')
-
-                result = cv2.matchTemplate(img1, img2, cv2.TM_CCOEFF_NORMED)
-
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-                # 返回最大匹配位置的坐标
-                if max_val > threshold:
-                    x, y = max_loc
-                    return (x, y)
-
-                # screen = G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY)
-                # if screen is None:
-                #     G.LOGGING.warning("Screen is None, may be locked")
-                # else:
-                #     if threshold:
-                #         query.threshold = threshold
-                #     match_pos = query.match_in(screen)
-                #     if match_pos:
-                #         # try_log_screen(screen)
-                #         self.lock.acquire()
-                #         if not self.sings:
-                #             self.sings = match_pos
-                #         self.lock.release()
-                #         return match_pos
-
-                if (time.time() - start_time) > timeout:
-                    # try_log_screen(screen)
-                    return False
-                else:
-                    time.sleep(interval)
-
 
-    def click_image(self, image, timeout=10, threshold=0.7, interval=0.5,click_timeout=0):
+        template = self.templates.get(image)
+
+        def detect(img1):
+            if pyramid:
+                match = match_pyramid(img1, template, threshold)
+            else:
+                match = match_best(img1, template, threshold)
+
+            # 返回最大匹配位置的中心坐标
+            if match:
+                return match.center
+
+            # screen = G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY)
+            # if screen is None:
+            #     G.LOGGING.warning("Screen is None, may be locked")
+            # else:
+            #     if threshold:
+            #         query.threshold = threshold
+            #     match_pos = query.match_in(screen)
+            #     if match_pos:
+            #         # try_log_screen(screen)
+            #         self.lock.acquire()
+            #         if not self.sings:
+            #             self.sings = match_pos
+            #         self.lock.release()
+            #         return match_pos
+            return None
+
+        return self.wait_screen(detect, timeout, interval=interval, max_interval=max(interval, 1.0))
+
+    def click_image(self, image, timeout=10, threshold=0.7, interval=0.5, click_timeout=0, pyramid=True):
         """
-        等待指定图片出现后点击其坐标
+        等待指定图片出现后点击其中心坐标
 
         :param image: 图片名称（不带扩展名，默认png格式）
         :param timeout: 等待超时时间（秒），默认10秒
         :param threshold: 图片匹配阈值（0-1），默认0.7
         :param interval: 检测间隔时间（秒），默认0.5秒
         :param intervalfunc: 检测间隔执行的函数（可选）
+        :param click_timeout: 点击前等待画面稳定的最长时间（秒），默认0
+        :param pyramid: 是否使用由粗到细的金字塔匹配，默认True
         :return: 图片在屏幕中的坐标（元组形式），若未找到则返回False
         """
         logger.debug(f"等待图片 {image} 出现")
-        match_pos = self.exists_image(image, timeout, threshold, interval)
+        match_pos = self.exists_image(image, timeout, threshold, interval, pyramid=pyramid)
         if match_pos:
-            sleep(click_timeout)
-            touch(match_pos)
+            self.wait_settle(click_timeout)
+            self.tap(match_pos)
             return match_pos
         return False
 
+    def match_images(self, images, threshold=0.7, frame=None, pyramid=True):
+        """
+        用同一帧一次性匹配多个模板，多个模板在线程池中并行匹配
+
+        :param images: 图片名称列表（不带扩展名）
+        :param threshold: 图片匹配阈值（0-1），也可以是{图片名称: 阈值}的字典
+        :param frame: 已获取的屏幕帧，为None时重新截图
+        :param pyramid: 是否使用由粗到细的金字塔匹配，默认True
+        :return: 所有命中的图片 {图片名称: Match}，Match包含坐标、尺寸和得分
+        """
+        if frame is None:
+            frame = self.get_screen()
+        if frame is None:
+            return dict()
+        templates = [self.templates.get(image) for image in images]
+        return match_many(frame, templates, threshold, self.executor, pyramid)
+
+    def find_images(self, image, threshold=0.7, sort="position", frame=None):
+        """
+        找出屏幕中所有与指定图片匹配的位置（同一图片出现多次时全部返回）
+
+        :param image: 图片名称（不带扩展名）
+        :param threshold: 图片匹配阈值（0-1），默认0.7
+        :param sort: 排序方式：position（从上到下、从左到右）、x、y、score，默认position
+        :param frame: 已获取的屏幕帧，为None时重新截图
+        :return: Match列表，Match.center为中心坐标，Match.score为得分
+        """
+        if frame is None:
+            frame = self.get_screen()
+        if frame is None:
+            return list()
+        return match_all(frame, self.templates.get(image), threshold, sort=sort)
+
+    def exists_images(self, images, timeout=10, threshold=0.7, interval=0.5):
+        """
+        等待多个图片中的任意一个出现，每次轮询只截一次图
+
+        :param images: 图片名称列表（不带扩展名）
+        :param timeout: 检测超时时间（秒），默认10秒
+        :param threshold: 图片匹配阈值（0-1），也可以是{图片名称: 阈值}的字典
+        :param interval: 检测间隔时间（秒），默认0.5秒
+        :return: 所有命中的图片 {图片名称: Match}，若超时未找到则返回False
+        """
+        logger.debug(f"判断图片{images}是否存在")
+        return self.wait_screen(lambda frame: self.match_images(images, threshold, frame),
+                                timeout, interval=interval, max_interval=max(interval, 1.0))
+
     def clear_sings(self):
         """
         重置同步信号量，用于清除之前的状态记录
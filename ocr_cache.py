@@ -0,0 +1,325 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# 持久化OCR缓存的默认路径
+OCR_CACHE_PATH = "cache/ocr_cache.sqlite3"
+
+
+def frame_key(frame, *extra):
+    """
+    计算帧内容的哈希值，作为缓存键
+
+    :param frame: 屏幕图像（numpy数组）
+    :param extra: 参与计算的附加信息（如裁剪区域）
+    :return: 十六进制哈希字符串
+    """
+    frame = np.ascontiguousarray(frame)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((frame.shape, frame.dtype.str) + extra).encode("utf-8"))
+    digest.update(frame)
+    return digest.hexdigest()
+
+
+class ScreenSignature(object):
+    """
+    画面的感知签名：粗粒度的分块灰度均值用于快速筛选候选（逐块比较，容忍压缩噪声和轻微亮度抖动），
+    原分辨率灰度图用于最终确认：按小块统计有明显差异的像素，任何一块超出预算就不是同一画面，
+    小字号的一位数字变化集中在一两个小块里，不会被整屏平均掉
+    """
+
+    def __init__(self, image, blocks=(16, 9)):
+        """
+        :param image: 图像（numpy数组，BGR格式或灰度）
+        :param blocks: 分块数（横, 纵），默认(16, 9)
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        self.shape = gray.shape
+        width, height = min(blocks[0], gray.shape[1]), min(blocks[1], gray.shape[0])
+        self.blocks = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA).ravel()
+        self.detail = np.ascontiguousarray(gray)
+
+    def near(self, blocks, tolerance=8):
+        """
+        :param blocks: 另一画面的分块灰度均值
+        :param tolerance: 每块均值的最大允许差，默认8
+        :return: 粗筛是否通过
+        """
+        return len(blocks) == len(self.blocks) and \
+            int(np.abs(blocks.astype(np.int16) - self.blocks.astype(np.int16)).max()) <= tolerance
+
+    def same(self, detail, pixel_tolerance=40, cell=16, max_pixels=3):
+        """
+        :param detail: 另一画面的确认用灰度图（原分辨率）
+        :param pixel_tolerance: 灰度差超过该值的像素视为不同，默认40
+        :param cell: 统计差异像素的小块边长，默认16
+        :param max_pixels: 每个小块最多允许多少个不同的像素，默认3
+        :return: 两个画面是否相同
+        """
+        if detail.shape != self.detail.shape:
+            return False
+        mask = (cv2.absdiff(detail, self.detail) > pixel_tolerance).astype(np.uint16)
+        height, width = mask.shape
+        padded = np.zeros((-(-height // cell) * cell, -(-width // cell) * cell), dtype=np.uint16)
+        padded[:height, :width] = mask
+        counts = padded.reshape(padded.shape[0] // cell, cell, padded.shape[1] // cell, cell).sum(axis=(1, 3))
+        return int(counts.max()) <= max_pixels
+
+
+def _to_builtin(value):
+    # PaddleOCR结果里的numpy数值转换为JSON可以保存的类型
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化: {type(value)}")
+
+
+class PersistentOcrCache(object):
+    """
+    跨运行持久化的OCR结果缓存（sqlite），以画面的感知签名查找，按最近使用时间淘汰，总大小有上限。
+    主页、基地、任务页等固定画面在每次运行和每轮定时任务中只需识别一次。
+    只有重复出现（在内存中等待确认期间再次被识别）的画面才写入磁盘，战斗、动画等一次性画面不会挤掉固定画面。
+    缓存绑定OCR引擎配置指纹，配置或paddleocr版本变化后旧结果自动清空。
+    """
+
+    # 表结构版本，变化时重建表
+    SCHEMA = 3
+
+    def __init__(self, fingerprint, path=OCR_CACHE_PATH, max_bytes=128 * 1024 * 1024, block_tolerance=8,
+                 pending_size=32):
+        """
+        :param fingerprint: OCR引擎配置指纹（LazyOcr.fingerprint）
+        :param path: 数据库文件路径，默认cache/ocr_cache.sqlite3
+        :param max_bytes: 缓存的总大小上限（字节），默认128MB
+        :param block_tolerance: 分块灰度均值的最大允许差，默认8
+        :param pending_size: 内存中等待再次出现的画面数量上限，默认32
+        """
+        self.fingerprint = fingerprint
+        self.path = path
+        self.max_bytes = max_bytes
+        self.block_tolerance = block_tolerance
+        self.hits = 0
+        self.misses = 0
+        self._pending = OrderedDict()
+        self._pending_size = pending_size
+        self._pending_ids = itertools.count()
+        # 内存索引：分组 -> (条目id列表, 分块均值矩阵)
+        self._index = dict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        stored = f"{fingerprint};schema={self.SCHEMA}"
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != stored:
+                if row is not None:
+                    logger.info("OCR引擎配置或缓存格式已变化，清空持久化OCR缓存")
+                self._db.execute("DROP TABLE IF EXISTS results")
+                self._db.execute("DROP TABLE IF EXISTS entries")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (stored,))
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, grp TEXT, blocks BLOB, "
+                             "detail BLOB, result TEXT, size INTEGER, used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            for entry_id, group, blocks in self._db.execute("SELECT id, grp, blocks FROM entries"):
+                self._index_add(group, entry_id, np.frombuffer(blocks, dtype=np.uint8))
+
+    @staticmethod
+    def _group(signature, roi):
+        return repr((signature.shape, tuple(roi) if roi else None))
+
+    def _index_add(self, group, entry_id, blocks):
+        ids, matrix = self._index.get(group, (list(), np.zeros((0, len(blocks)), dtype=np.uint8)))
+        if matrix.shape[1] != len(blocks):
+            return
+        self._index[group] = (ids + [entry_id], np.vstack([matrix, blocks[None, :]]))
+
+    def _index_remove(self, entry_ids):
+        entry_ids = set(entry_ids)
+        for group, (ids, matrix) in list(self._index.items()):
+            keep = [i for i, entry_id in enumerate(ids) if entry_id not in entry_ids]
+            if len(keep) != len(ids):
+                self._index[group] = ([ids[i] for i in keep], matrix[keep])
+
+    @staticmethod
+    def signature(image):
+        """
+        计算画面签名，同一张图的get和put共用一个
+
+        :param image: 识别的图像（numpy数组，BGR格式）
+        :return: ScreenSignature
+        """
+        return ScreenSignature(image)
+
+    def _candidates(self, ids, matrix, signature):
+        # 分块均值逐块比较，按最大差从小到大返回候选
+        if not len(ids):
+            return list()
+        distance = np.abs(matrix.astype(np.int16) - signature.blocks.astype(np.int16)).max(axis=1)
+        order = np.argsort(distance)
+        return [ids[i] for i in order if distance[i] <= self.block_tolerance]
+
+    def get(self, signature, roi=None):
+        """
+        查找相同画面的OCR结果并刷新最近使用时间
+
+        :param signature: 识别图像的签名（signature()的返回值）
+        :param roi: 图像在屏幕上的区域，不同区域分开缓存
+        :return: OCR结果，未命中返回None
+        """
+        group = self._group(signature, roi)
+        with self._lock, self._db:
+            ids, matrix = self._index.get(group, (list(), None))
+            for entry_id in self._candidates(ids, matrix, signature):
+                detail, result = self._db.execute("SELECT detail, result FROM entries WHERE id = ?",
+                                                  (entry_id,)).fetchone()
+                detail = cv2.imdecode(np.frombuffer(detail, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                if detail is not None and signature.same(detail):
+                    self._db.execute("UPDATE entries SET used = ? WHERE id = ?", (time.time(), entry_id))
+                    self.hits += 1
+                    return json.loads(result)
+            self.misses += 1
+        return None
+
+    def put(self, signature, roi, result):
+        """
+        记录OCR结果：画面第一次出现时只在内存中等待，再次出现时才写入数据库，总大小超出上限时淘汰最久未使用的条目
+
+        :param signature: 识别图像的签名（signature()的返回值）
+        :param roi: 图像在屏幕上的区域
+        :param result: OCR结果
+        """
+        group = self._group(signature, roi)
+        with self._lock:
+            seen = None
+            for key, (pending_group, pending) in self._pending.items():
+                if pending_group == group and signature.near(pending.blocks, self.block_tolerance) \
+                        and signature.same(pending.detail):
+                    seen = key
+                    break
+            if seen is None:
+                self._pending[next(self._pending_ids)] = (group, signature)
+                while len(self._pending) > self._pending_size:
+                    self._pending.popitem(last=False)
+                return
+            del self._pending[seen]
+            data = json.dumps(result, default=_to_builtin, ensure_ascii=False)
+            detail = cv2.imencode(".png", signature.detail)[1].tobytes()
+            blocks = signature.blocks.tobytes()
+            size = len(data) + len(detail) + len(blocks)
+            with self._db:
+                cursor = self._db.execute("INSERT INTO entries (grp, blocks, detail, result, size, used) "
+                                          "VALUES (?, ?, ?, ?, ?, ?)",
+                                          (group, blocks, detail, data, size, time.time()))
+                self._index_add(group, cursor.lastrowid, signature.blocks)
+                self._size += size
+                if self._size > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        # 淘汰到上限的90%，避免每次写入都触发淘汰
+        target = self.max_bytes * 0.9
+        victims = list()
+        for entry_id, size in self._db.execute("SELECT id, size FROM entries ORDER BY used"):
+            if self._size <= target:
+                break
+            victims.append(entry_id)
+            self._size -= size
+        self._db.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in victims])
+        self._index_remove(victims)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+            self._index.clear()
+            self._pending.clear()
+            self._size = 0
+
+    def close(self):
+        """
+        关闭数据库
+        """
+        with self._lock:
+            self._db.close()
+
+
+class FrameOcrCache(object):
+    """
+    以帧内容哈希为键的OCR结果缓存（LRU + 过期时间），同一画面只做一次OCR
+    """
+
+    def __init__(self, maxsize=8, ttl=3.0):
+        """
+        初始化缓存
+
+        :param maxsize: 最多缓存的帧数，默认8
+        :param ttl: 缓存有效时间（秒），默认3秒
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        获取缓存的OCR结果
+
+        :param key: 帧哈希
+        :return: OCR结果，未命中或已过期返回None
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            created, result = item
+            if time.time() - created > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        """
+        写入OCR结果，超出容量时淘汰最久未使用的条目
+
+        :param key: 帧哈希
+        :param result: OCR结果
+        """
+        with self._lock:
+            self._data[key] = (time.time(), result)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._data.clear()
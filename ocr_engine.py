@@ -0,0 +1,316 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import gc
+import os
+import threading
+import time
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# OCR引擎状态
+STATUS_IDLE = "未加载"
+STATUS_LOADING = "加载中"
+STATUS_READY = "就绪"
+STATUS_FAILED = "加载失败"
+
+# OCR运行方式：local在当前进程内推理，process在独立的工作进程中推理
+BACKEND_LOCAL = "local"
+BACKEND_PROCESS = "process"
+
+
+def process_memory():
+    """
+    :return: 当前进程占用的物理内存（字节），未安装psutil时返回None
+    """
+    if psutil is None:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+def create_ocr(use_angle_cls=True, lang="ch", backend=BACKEND_LOCAL):
+    """
+    创建OCR引擎，paddleocr在这里才导入，避免拖慢程序启动
+
+    :param use_angle_cls: 是否启用方向分类，默认True
+    :param lang: 识别语言，默认ch
+    :param backend: 运行方式，local为当前进程内的PaddleOCR，process为进程外的OcrWorkerPool
+    :return: PaddleOCR或OcrWorkerPool实例（接口一致）
+    """
+    if backend == BACKEND_PROCESS:
+        from ocr_pool import OcrWorkerPool
+        pool = OcrWorkerPool(use_angle_cls=use_angle_cls, lang=lang)
+        try:
+            pool.wait_ready()
+        except Exception:
+            pool.close()
+            raise
+        return pool
+    if backend != BACKEND_LOCAL:
+        raise ValueError(f"不支持的OCR运行方式: {backend}")
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=use_angle_cls, lang=lang)
+
+
+def engine_fingerprint(use_angle_cls=True, lang="ch"):
+    """
+    OCR引擎配置指纹，配置或paddleocr版本变化时随之变化，用于让持久化的识别结果失效（运行方式不影响识别结果，不参与计算）
+
+    :param use_angle_cls: 是否启用方向分类
+    :param lang: 识别语言
+    :return: 指纹字符串
+    """
+    try:
+        from importlib.metadata import version
+        paddleocr_version = version("paddleocr")
+    except Exception:
+        paddleocr_version = "unknown"
+    return f"paddleocr={paddleocr_version};use_angle_cls={use_angle_cls};lang={lang};cls=True"
+
+
+class LazyOcr(object):
+    """
+    延迟加载的OCR引擎：第一次识别时才构建模型，也可以调用warm_up在后台线程提前加载
+    """
+
+    def __init__(self, use_angle_cls=True, lang="ch", backend=BACKEND_LOCAL):
+        """
+        :param use_angle_cls: 是否启用方向分类，默认True
+        :param lang: 识别语言，默认ch
+        :param backend: 运行方式，local或process，默认local
+        """
+        self.use_angle_cls = use_angle_cls
+        self.lang = lang
+        self.backend = backend
+        self.status = STATUS_IDLE
+        self.error = None
+        self.memory = None
+        self.load_time = None
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        获取PaddleOCR实例，未加载时在当前线程加载（其他线程正在加载时等待其完成）
+
+        :return: PaddleOCR实例
+        """
+        if self._engine is not None:
+            return self._engine
+        with self._lock:
+            if self._engine is None:
+                self.status = STATUS_LOADING
+                start_time = time.time()
+                memory_before = process_memory()
+                try:
+                    self._engine = create_ocr(self.use_angle_cls, self.lang, self.backend)
+                except Exception as e:
+                    self.status = STATUS_FAILED
+                    self.error = e
+                    logger.error(f"OCR引擎加载失败: {e}")
+                    raise
+                self.load_time = time.time() - start_time
+                if hasattr(self._engine, "memory"):
+                    # 进程外引擎统计工作进程的内存
+                    self.memory = self._engine.memory()
+                elif memory_before is not None:
+                    self.memory = max(process_memory() - memory_before, 0)
+                self.status = STATUS_READY
+                logger.info(f"OCR引擎{self.key}加载完成，耗时{self.load_time:.1f}秒，"
+                            f"内存{format_memory(self.memory)}")
+        return self._engine
+
+    def warm_up(self):
+        """
+        在后台线程中预热OCR引擎，不阻塞调用方
+
+        :return: 预热线程
+        """
+        def worker():
+            try:
+                self.get()
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=worker, name="ocr-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self):
+        """
+        卸载模型释放内存，下次识别时会重新加载
+        """
+        with self._lock:
+            if self._engine is None:
+                return
+            engine, self._engine = self._engine, None
+            self.status = STATUS_IDLE
+            self.memory = None
+        if hasattr(engine, "close"):
+            engine.close()
+        del engine
+        gc.collect()
+        logger.info(f"OCR引擎{self.key}已卸载")
+
+    @property
+    def key(self):
+        """
+        :return: 引擎配置键 (use_angle_cls, lang, backend)
+        """
+        return self.use_angle_cls, self.lang, self.backend
+
+    @property
+    def fingerprint(self):
+        """
+        :return: 引擎配置指纹（见engine_fingerprint）
+        """
+        return engine_fingerprint(self.use_angle_cls, self.lang)
+
+    @property
+    def ready(self):
+        """
+        :return: OCR引擎是否已加载完成
+        """
+        return self._engine is not None
+
+    def ocr(self, img, **kwargs):
+        """
+        文字识别，参数与PaddleOCR.ocr一致
+
+        :param img: 图片（numpy数组或路径）
+        :return: PaddleOCR识别结果
+        """
+        return self.get().ocr(img, **kwargs)
+
+
+def format_memory(size):
+    """
+    :param size: 字节数
+    :return: 便于阅读的内存大小
+    """
+    if size is None:
+        return "未知"
+    return f"{size / 1024 / 1024:.0f}MB"
+
+
+class OcrRegistry(object):
+    """
+    进程内的OCR引擎注册表：按配置共享引擎，记录引用计数和内存占用，支持显式卸载
+    """
+
+    def __init__(self):
+        self._engines = dict()
+        self._refs = dict()
+        self._lock = threading.Lock()
+
+    def get(self, use_angle_cls=True, lang="ch", backend=BACKEND_LOCAL):
+        """
+        获取指定配置的引擎（不增加引用计数），不存在时创建一个尚未加载的引擎
+
+        :param use_angle_cls: 是否启用方向分类，默认True
+        :param lang: 识别语言，默认ch
+        :param backend: 运行方式，local或process，默认local
+        :return: LazyOcr
+        """
+        key = (use_angle_cls, lang, backend)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = self._engines[key] = LazyOcr(use_angle_cls, lang, backend)
+                self._refs[key] = 0
+            return engine
+
+    def acquire(self, use_angle_cls=True, lang="ch", backend=BACKEND_LOCAL):
+        """
+        获取指定配置的引擎并增加引用计数，用完后调用release
+
+        :param use_angle_cls: 是否启用方向分类，默认True
+        :param lang: 识别语言，默认ch
+        :param backend: 运行方式，local或process，默认local
+        :return: LazyOcr
+        """
+        engine = self.get(use_angle_cls, lang, backend)
+        with self._lock:
+            self._refs[engine.key] += 1
+        return engine
+
+    def release(self, engine):
+        """
+        减少引擎的引用计数，引用计数归零后模型仍保留在内存中，需要时调用unload_idle释放
+
+        :param engine: acquire返回的LazyOcr
+        """
+        with self._lock:
+            if self._refs.get(engine.key, 0) > 0:
+                self._refs[engine.key] -= 1
+
+    def unload(self, use_angle_cls=True, lang="ch", backend=BACKEND_LOCAL):
+        """
+        卸载指定配置的引擎（不管引用计数）
+
+        :param use_angle_cls: 是否启用方向分类，默认True
+        :param lang: 识别语言，默认ch
+        :param backend: 运行方式，local或process，默认local
+        """
+        with self._lock:
+            engine = self._engines.get((use_angle_cls, lang, backend))
+        if engine is not None:
+            engine.unload()
+
+    def unload_idle(self):
+        """
+        卸载所有引用计数为0的引擎
+
+        :return: 释放的内存（字节，未知时不计入）
+        """
+        with self._lock:
+            idle = [engine for key, engine in self._engines.items() if self._refs[key] == 0 and engine.ready]
+        freed = 0
+        for engine in idle:
+            freed += engine.memory or 0
+            engine.unload()
+        return freed
+
+    def stats(self):
+        """
+        :return: 每个引擎的状态列表 [{"key", "refs", "status", "memory", "load_time"}, ...]
+        """
+        with self._lock:
+            return [{
+                "key": key,
+                "refs": self._refs[key],
+                "status": engine.status,
+                "memory": engine.memory,
+                "load_time": engine.load_time,
+            } for key, engine in self._engines.items()]
+
+    def total_memory(self):
+        """
+        :return: 所有已加载引擎的内存占用之和（字节，未知的不计入）
+        """
+        return sum(item["memory"] or 0 for item in self.stats() if item["status"] == STATUS_READY)
+
+
+_registry = OcrRegistry()
+
+
+def get_registry():
+    """
+    :return: 进程内共享的OCR引擎注册表
+    """
+    return _registry
+
+
+def get_default_ocr(backend=BACKEND_LOCAL):
+    """
+    获取默认配置（方向分类、中文）的共享OCR引擎，重新连接设备时不会重复加载模型
+
+    :param backend: 运行方式，local或process，默认local
+    :return: LazyOcr
+    """
+    return _registry.get(backend=backend)
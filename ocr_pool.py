@@ -0,0 +1,273 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 每个工作进程初始的共享内存大小，默认能放下一张1920x1080的RGBA截图，遇到更大的图像时自动换成更大的共享内存
+DEFAULT_FRAME_BYTES = 1920 * 1080 * 4
+
+
+def _worker_main(conn, shm_name, use_angle_cls, lang):
+    """
+    OCR工作进程入口：加载模型后循环处理请求，像素数据从共享内存读取，不经过序列化
+
+    :param conn: 与主进程通信的管道
+    :param shm_name: 初始共享内存名称（主进程换用更大的共享内存时，请求中会带上新的名称）
+    :param use_angle_cls: 是否启用方向分类
+    :param lang: 识别语言
+    """
+    from ocr_engine import create_ocr
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        try:
+            engine = create_ocr(use_angle_cls, lang)
+        except Exception as e:
+            conn.send(("ready", repr(e)))
+            return
+        conn.send(("ready", None))
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            request_id, name, shape, dtype, kwargs = message
+            if name != shm.name:
+                shm.close()
+                shm = shared_memory.SharedMemory(name=name)
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            try:
+                conn.send((request_id, None, engine.ocr(frame, **kwargs)))
+            except Exception as e:
+                conn.send((request_id, repr(e), None))
+            del frame
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+
+
+class _Worker(object):
+    """
+    一个OCR工作进程及其专用的共享内存
+    """
+
+    def __init__(self, context, frame_bytes, use_angle_cls, lang):
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, name="ocr-worker",
+                                       args=(child_conn, self.shm.name, use_angle_cls, lang), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        """
+        等待工作进程加载完模型
+
+        :param timeout: 超时时间（秒）
+        :raises TimeoutError: 超时未加载完成
+        :raises RuntimeError: 模型加载失败
+        """
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError("OCR工作进程加载模型超时")
+        _, error = self.conn.recv()
+        if error:
+            raise RuntimeError(f"OCR工作进程加载模型失败: {error}")
+        self.ready = True
+
+    def run(self, request_id, frame, kwargs, timeout):
+        """
+        把帧写入共享内存并等待识别结果，图像大于共享内存时先换用足够大的共享内存
+
+        :return: PaddleOCR识别结果
+        :raises TimeoutError: 超时未返回结果
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.shm.size:
+            self.resize(frame.nbytes)
+        target = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf)
+        target[...] = frame
+        del target
+        self.conn.send((request_id, self.shm.name, frame.shape, frame.dtype.str, kwargs))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"OCR请求超时({timeout:.1f}秒)")
+        response_id, error, result = self.conn.recv()
+        if response_id != request_id:
+            raise RuntimeError("OCR工作进程返回了错误的请求结果")
+        if error:
+            raise RuntimeError(f"OCR识别失败: {error}")
+        return result
+
+    def resize(self, size):
+        """
+        换用更大的共享内存，工作进程在收到下一个请求时切换过去
+
+        :param size: 需要的字节数
+        """
+        old, self.shm = self.shm, shared_memory.SharedMemory(create=True, size=size)
+        old.close()
+        try:
+            old.unlink()
+        except FileNotFoundError:
+            pass
+
+    def memory(self):
+        """
+        :return: 工作进程占用的物理内存（字节），未安装psutil时返回None
+        """
+        if psutil is None or not self.process.is_alive():
+            return None
+        try:
+            return psutil.Process(self.process.pid).memory_info().rss
+        except psutil.Error:
+            return None
+
+    def stop(self, terminate=False):
+        """
+        停止工作进程并释放共享内存
+
+        :param terminate: 是否强制结束（工作进程卡死时使用）
+        """
+        try:
+            if not terminate and self.process.is_alive():
+                self.conn.send(None)
+                self.process.join(timeout=5)
+        except (OSError, EOFError):
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        self.conn.close()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class OcrWorkerPool(object):
+    """
+    进程外OCR工作池：推理在独立进程中执行，不和界面线程争抢GIL，Paddle运行时卡死或泄漏也不会拖垮主程序。
+    接口与PaddleOCR.ocr一致，可以直接作为Tools的OCR引擎使用。
+    """
+
+    def __init__(self, workers=2, max_pending=4, timeout=30, load_timeout=300,
+                 frame_bytes=DEFAULT_FRAME_BYTES, use_angle_cls=True, lang="ch"):
+        """
+        :param workers: 工作进程数，默认2
+        :param max_pending: 除正在执行的请求外最多排队的请求数，默认4
+        :param timeout: 单个请求的超时时间（秒），超时的工作进程会被结束并重启，默认30秒
+        :param load_timeout: 工作进程加载模型的超时时间（秒），默认300秒
+        :param frame_bytes: 每个工作进程初始的共享内存大小（字节），遇到更大的图像时自动扩大
+        :param use_angle_cls: 是否启用方向分类，默认True
+        :param lang: 识别语言，默认ch
+        """
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self.frame_bytes = frame_bytes
+        self.use_angle_cls = use_angle_cls
+        self.lang = lang
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._idle = queue.Queue()
+        self._workers = list()
+        self._request_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._spawn()
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.frame_bytes, self.use_angle_cls, self.lang)
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+        return worker
+
+    def _replace(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop(terminate=True)
+        if not self._closed:
+            logger.warning("OCR工作进程无响应，已重启")
+            self._spawn()
+
+    def wait_ready(self):
+        """
+        等待所有工作进程加载完模型
+        """
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.wait_ready(self.load_timeout)
+
+    def ocr(self, img, timeout=None, **kwargs):
+        """
+        文字识别，参数与PaddleOCR.ocr一致
+
+        :param img: 图片（numpy数组）
+        :param timeout: 本次请求的超时时间（秒），默认使用初始化时的timeout
+        :return: PaddleOCR识别结果
+        :raises TimeoutError: 排队或识别超时
+        """
+        if self._closed:
+            raise RuntimeError("OCR工作池已关闭")
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("OCR请求队列已满")
+        try:
+            try:
+                worker = self._idle.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                raise TimeoutError("等待空闲OCR工作进程超时")
+            try:
+                worker.wait_ready(self.load_timeout)
+                result = worker.run(next(self._request_ids), img, kwargs, max(deadline - time.time(), 0.1))
+                # 重启的工作进程直接使用扩大后的大小
+                self.frame_bytes = max(self.frame_bytes, worker.shm.size)
+            except (TimeoutError, EOFError, OSError):
+                self._replace(worker)
+                raise
+            except Exception:
+                self._idle.put(worker)
+                raise
+            self._idle.put(worker)
+            return result
+        finally:
+            self._slots.release()
+
+    def memory(self):
+        """
+        :return: 所有工作进程占用的物理内存之和（字节），未知时返回None
+        """
+        with self._lock:
+            sizes = [worker.memory() for worker in self._workers]
+        sizes = [size for size in sizes if size is not None]
+        return sum(sizes) if sizes else None
+
+    def close(self):
+        """
+        停止所有工作进程并释放共享内存
+        """
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, list()
+        for worker in workers:
+            worker.stop()
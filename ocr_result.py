@@ -0,0 +1,223 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import re
+from collections import namedtuple
+
+
+class OcrBox(namedtuple("OcrBox", ["text", "x1", "y1", "x2", "y2", "score"])):
+    """
+    一个OCR文本框（外接矩形，整屏坐标）
+    """
+    __slots__ = ()
+
+    @property
+    def center(self):
+        """
+        :return: 中心坐标 (x, y)
+        """
+        return (self.x1 + self.x2) / 2, (self.y1 + self.y2) / 2
+
+
+class OcrResult(object):
+    """
+    一帧画面的结构化OCR结果：保留全部文本框（包括重复的文字），并按网格建立空间索引，
+    区域查询和"某标签下方最近的文本"只访问相关的网格
+    """
+
+    def __init__(self, boxes, cell=64):
+        """
+        :param boxes: OcrBox列表
+        :param cell: 网格边长（像素），默认64
+        """
+        self.boxes = list(boxes)
+        self.cell = cell
+        self._grid = dict()
+        for index, box in enumerate(self.boxes):
+            for key in self._cells(box.x1, box.y1, box.x2, box.y2):
+                self._grid.setdefault(key, list()).append(index)
+        self._rows = max((key[1] for key in self._grid), default=-1)
+        self._columns = max((key[0] for key in self._grid), default=-1)
+
+    @classmethod
+    def from_paddle(cls, ocr_result, cell=64):
+        """
+        从PaddleOCR原始识别结果创建
+
+        :param ocr_result: PaddleOCR原始识别结果
+        :param cell: 网格边长（像素），默认64
+        :return: OcrResult
+        """
+        boxes = list()
+        for line in ocr_result or list():
+            for points, (text, score) in line or list():
+                xs = [point[0] for point in points]
+                ys = [point[1] for point in points]
+                boxes.append(OcrBox(text, min(xs), min(ys), max(xs), max(ys), score))
+        return cls(boxes, cell)
+
+    def __iter__(self):
+        return iter(self.boxes)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cells(self, x1, y1, x2, y2):
+        for row in range(int(max(y1, 0) // self.cell), int(max(y2, 0) // self.cell) + 1):
+            for column in range(int(max(x1, 0) // self.cell), int(max(x2, 0) // self.cell) + 1):
+                yield column, row
+
+    def _candidates(self, x1, y1, x2, y2):
+        seen = set()
+        for key in self._cells(x1, y1, x2, y2):
+            for index in self._grid.get(key, ()):
+                if index not in seen:
+                    seen.add(index)
+                    yield self.boxes[index]
+
+    def find(self, text, mode="txt"):
+        """
+        查找文字
+
+        :param text: 目标文本
+        :param mode: txt精确匹配，ocr包含匹配，默认txt
+        :return: 匹配的OcrBox列表（从上到下、从左到右）
+        """
+        if mode == "ocr":
+            boxes = [box for box in self.boxes if text in box.text]
+        else:
+            boxes = [box for box in self.boxes if box.text == text]
+        return sorted(boxes, key=lambda box: (box.y1, box.x1))
+
+    def in_region(self, roi, predicate=None):
+        """
+        查找与区域相交的文本框
+
+        :param roi: 区域 [x1, y1, width, height]
+        :param predicate: 过滤函数，参数为OcrBox（可选）
+        :return: OcrBox列表（从上到下、从左到右）
+        """
+        x, y, width, height = roi
+        boxes = [box for box in self._candidates(x, y, x + width, y + height)
+                 if box.x1 < x + width and box.x2 > x and box.y1 < y + height and box.y2 > y
+                 and (predicate is None or predicate(box))]
+        return sorted(boxes, key=lambda box: (box.y1, box.x1))
+
+    def nearest_below(self, label, predicate=None, max_distance=None, slack=0):
+        """
+        查找标签正下方（横向有重叠）最近的文本框，按网格行从上往下搜索，找到即停止
+
+        :param label: 标签OcrBox
+        :param predicate: 过滤函数，参数为OcrBox（可选）
+        :param max_distance: 最大竖直距离（像素），默认不限
+        :param slack: 横向重叠判断放宽的像素数，默认0
+        :return: OcrBox，没有时返回None
+        """
+        x1, x2 = label.x1 - slack, label.x2 + slack
+        limit = label.y2 + max_distance if max_distance is not None else float("inf")
+        best = None
+        row = int(max(label.y2, 0) // self.cell)
+        while row <= self._rows:
+            top = row * self.cell
+            if top > limit:
+                break
+            for box in self._candidates(x1, top, x2, top + self.cell - 1):
+                if box is label or box.y1 < label.y2 or box.y1 > limit or box.x1 > x2 or box.x2 < x1:
+                    continue
+                if predicate is not None and not predicate(box):
+                    continue
+                if best is None or box.y1 < best.y1:
+                    best = box
+            # 更靠下的网格里的文本框不可能更近
+            if best is not None and best.y1 < top + self.cell:
+                return best
+            row += 1
+        return best
+
+    def nearest_right(self, label, predicate=None, max_distance=None, slack=0, overlap=4):
+        """
+        查找标签同一行右侧（纵向有重叠）最近的文本框，按网格列从左往右搜索，找到即停止
+
+        :param label: 标签OcrBox
+        :param predicate: 过滤函数，参数为OcrBox（可选）
+        :param max_distance: 最大水平距离（像素），默认不限
+        :param slack: 纵向重叠判断放宽的像素数，默认0
+        :param overlap: 允许与标签横向重叠的像素数（检测框常有几个像素的重叠），默认4
+        :return: OcrBox，没有时返回None
+        """
+        y1, y2 = label.y1 - slack, label.y2 + slack
+        start = label.x2 - overlap
+        limit = label.x2 + max_distance if max_distance is not None else float("inf")
+        best = None
+        column = int(max(start, 0) // self.cell)
+        while column <= self._columns:
+            left = column * self.cell
+            if left > limit:
+                break
+            for box in self._candidates(left, y1, left + self.cell - 1, y2):
+                if box is label or box.x1 < start or box.x1 > limit or box.y1 > y2 or box.y2 < y1:
+                    continue
+                if predicate is not None and not predicate(box):
+                    continue
+                if best is None or box.x1 < best.x1:
+                    best = box
+            # 更靠右的网格里的文本框不可能更近
+            if best is not None and best.x1 < left + self.cell:
+                return best
+            column += 1
+        return best
+
+    def nearest_left(self, label, predicate=None, max_distance=None, slack=0, overlap=4):
+        """
+        查找标签同一行左侧（纵向有重叠）最近的文本框，按网格列从右往左搜索，找到即停止
+
+        :param label: 标签OcrBox
+        :param predicate: 过滤函数，参数为OcrBox（可选）
+        :param max_distance: 最大水平距离（像素），默认不限
+        :param slack: 纵向重叠判断放宽的像素数，默认0
+        :param overlap: 允许与标签横向重叠的像素数（检测框常有几个像素的重叠），默认4
+        :return: OcrBox，没有时返回None
+        """
+        y1, y2 = label.y1 - slack, label.y2 + slack
+        start = label.x1 + overlap
+        limit = label.x1 - max_distance if max_distance is not None else float("-inf")
+        best = None
+        column = int(max(start, 0) // self.cell)
+        while column >= 0:
+            right = (column + 1) * self.cell - 1
+            if right < limit:
+                break
+            for box in self._candidates(column * self.cell, y1, right, y2):
+                if box is label or box.x2 > start or box.x2 < limit or box.y1 > y2 or box.y2 < y1:
+                    continue
+                if predicate is not None and not predicate(box):
+                    continue
+                if best is None or box.x2 > best.x2:
+                    best = box
+            # 更靠左的网格里的文本框不可能更近
+            if best is not None and best.x2 >= column * self.cell:
+                return best
+            column -= 1
+        return best
+
+    def below(self, label, predicate=None):
+        """
+        标签下方的所有文本框（整行宽度）
+
+        :param label: 标签OcrBox
+        :param predicate: 过滤函数，参数为OcrBox（可选）
+        :return: OcrBox列表（从上到下、从左到右）
+        """
+        right = (self._columns + 1) * self.cell
+        bottom = (self._rows + 1) * self.cell
+        return [box for box in self.in_region([0, label.y2, right, max(bottom - label.y2, 0)], predicate)
+                if box.y1 >= label.y2]
+
+    def numbers(self, boxes=None, min_digits=1):
+        """
+        :param boxes: 要过滤的文本框，默认全部
+        :param min_digits: 至少连续多少位数字，默认1
+        :return: 包含数字的文本框列表
+        """
+        pattern = re.compile(r"\d{%d}" % min_digits)
+        return [box for box in (self.boxes if boxes is None else boxes) if pattern.search(box.text)]
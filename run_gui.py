@@ -3,10 +3,15 @@
 启动脚本 - 直接运行MCCAA GUI应用
 """
 
+import multiprocessing
 import sys
 import os
 from pathlib import Path
 
+if __name__ == "__main__":
+    # 打包成exe后OCR工作进程需要：工作进程从这里启动时直接进入工作进程入口，不再运行GUI
+    multiprocessing.freeze_support()
+
 # 添加当前目录到Python路径
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
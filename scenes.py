@@ -0,0 +1,360 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from loguru import logger
+
+from text_match import best_matches, parse_target
+
+
+class SceneError(ValueError):
+    """
+    步骤执行时画面停留在了另一个已知界面
+    """
+
+    def __init__(self, expected, actual):
+        """
+        :param expected: 期望的界面名称列表
+        :param actual: 实际识别到的界面名称
+        """
+        super().__init__(f"期望界面 {'/'.join(expected)}，实际为 {actual}")
+        self.expected = expected
+        self.actual = actual
+
+
+class Reroute(Exception):
+    """
+    guard请求先导航到其他界面再继续等待。由wait_screen捕获，在结束流水线截图之后执行导航，
+    避免导航中的截图与后台截图线程同时进行
+    """
+
+    def __init__(self, navigate, message=""):
+        """
+        :param navigate: 导航函数，参数为允许使用的最长时间（秒）
+        :param message: 说明
+        """
+        super().__init__(message)
+        self.navigate = navigate
+
+
+class Scene(object):
+    """
+    界面定义：用OCR文字锚点和模板图片锚点识别一个界面
+    """
+
+    def __init__(self, name, texts=(), images=(), min_hits=None, excludes=()):
+        """
+        :param name: 界面名称
+        :param texts: 文字锚点，元素格式同Tools.search_any_txt的targets（文本或(文本, 匹配方式[, 相似度阈值])）
+        :param images: 模板图片锚点，元素为图片名称或(图片名称, 匹配阈值)
+        :param min_hits: 至少命中多少个锚点才认为是该界面，默认全部命中
+        :param excludes: 排除锚点，格式同texts，出现任意一个就不是该界面（用于区分标题里仍显示上一级入口文字的下级界面）
+        """
+        self.name = name
+        self.texts = [parse_target(text) for text in texts]
+        self.excludes = [parse_target(text) for text in excludes]
+        self.images = [image if isinstance(image, tuple) else (image, 0.8) for image in images]
+        self.min_hits = min_hits or len(self.texts) + len(self.images)
+
+    def score(self, texts, images):
+        """
+        计算界面得分
+
+        :param texts: 当前画面识别出的文字列表
+        :param images: 当前画面命中的模板图片名称集合
+        :return: 命中锚点的比例（0-1），命中数少于min_hits或出现排除锚点时为0
+        """
+        if any(text_hit(text, texts) for text in self.excludes):
+            return 0.0
+        hits = sum(1 for text in self.texts if text_hit(text, texts))
+        hits += sum(1 for name, _ in self.images if name in images)
+        if hits < self.min_hits:
+            return 0.0
+        return hits / (len(self.texts) + len(self.images))
+
+
+def text_hit(target, texts):
+    """
+    :param target: parse_target解析后的(目标文本, 匹配方式, 相似度阈值)
+    :param texts: 识别出的文字列表
+    :return: 目标文本是否出现
+    """
+    target_text, mode, ratio = target
+    if mode == "txt":
+        return target_text in texts
+    if mode == "ocr":
+        return any(target_text in text for text in texts)
+    return best_matches([target_text], texts, ratio)[0] is not None
+
+
+# 边：从source界面执行actions到达target界面，actions元素为("txt", 文本)或("image", 图片名称[, 匹配阈值])
+Edge = namedtuple("Edge", ["source", "target", "actions"])
+
+SCENES = [
+    Scene("login", texts=["开始游戏"]),
+    Scene("home", texts=["出击", "基地"]),
+    Scene("task", texts=["日常", "周常"]),
+    Scene("guide", texts=["每日任务", "每周任务", "本期任务"], min_hits=2),
+    # 下级界面的标题里可能仍显示上一级的入口文字，上一级界面用下级界面的锚点排除
+    Scene("sortie", texts=["模拟军演"], excludes=["镜像竞技", ("战力", "ocr")]),
+    Scene("drill", texts=["镜像竞技"], excludes=[("战力", "ocr")]),
+    Scene("arena", texts=[("战力", "ocr")], images=[("refresh", 0.6)], min_hits=1),
+    Scene("base", texts=["合成工厂"], images=[("trade", 0.9)], min_hits=1, excludes=["构建订单", "选择好友", "基地素材"]),
+    Scene("trade", texts=["构建订单", "选择好友"], min_hits=1),
+    Scene("factory", texts=["基地素材", "稀有黑匣"]),
+]
+
+EDGES = [
+    Edge("login", "home", [("txt", "开始游戏")]),
+    Edge("home", "task", [("txt", "任务")]),
+    Edge("home", "guide", [("txt", "勘探指南"), ("txt", "任务")]),
+    Edge("home", "sortie", [("txt", "出击")]),
+    Edge("sortie", "drill", [("txt", "模拟军演")]),
+    Edge("drill", "arena", [("txt", "镜像竞技")]),
+    Edge("home", "base", [("txt", "基地")]),
+    Edge("base", "trade", [("image", "trade", 0.9)]),
+    Edge("base", "factory", [("txt", "合成工厂"), ("image", "factory")]),
+] + [Edge(name, "home", [("image", "home")])
+     for name in ("task", "guide", "sortie", "drill", "arena", "base", "trade", "factory")]
+
+
+class SceneClassifier(object):
+    """
+    界面识别：一帧画面只做一次OCR和一次多模板匹配，给出得分最高的界面，最高分并列时视为无法识别
+    """
+
+    def __init__(self, tools, scenes=None):
+        """
+        :param tools: Tools实例（提供截图、OCR缓存和模板匹配）
+        :param scenes: 界面定义列表，默认SCENES
+        """
+        self.tools = tools
+        self.scenes = list(scenes or SCENES)
+
+    def classify(self, frame=None):
+        """
+        识别当前画面属于哪个界面，并更新tools.scene（无法识别时保留上一次识别的界面）
+
+        :param frame: 屏幕帧，为None时重新截图
+        :return: 界面名称，无法识别返回None
+        """
+        if frame is None:
+            frame = self.tools.get_screen()
+        if frame is None:
+            return None
+        texts = [box[0] for box in self.tools.ocr_boxes(frame)]
+        thresholds = dict()
+        for scene in self.scenes:
+            for name, threshold in scene.images:
+                thresholds[name] = min(threshold, thresholds.get(name, threshold))
+        images = set(self.tools.match_images(list(thresholds), thresholds, frame)) if thresholds else set()
+        best = self.best(texts, images)
+        # 文字位置记忆按识别到的界面分组；点击后画面在过渡中常常无法识别，沿用上一次的界面，
+        # 位置记忆的验证失败时会回退到整屏检测
+        if best is not None:
+            self.tools.scene = best
+        return best
+
+    def best(self, texts, images):
+        """
+        按锚点给出得分最高的界面
+
+        :param texts: 识别出的文字列表
+        :param images: 命中的模板图片名称集合
+        :return: 界面名称，没有界面得分或最高分并列时返回None
+        """
+        scores = [(scene.score(texts, images), scene.name) for scene in self.scenes]
+        best_score = max((score for score, _ in scores), default=0.0)
+        if not best_score:
+            return None
+        names = [name for score, name in scores if score == best_score]
+        if len(names) > 1:
+            logger.debug(f"界面识别并列: {names}")
+            return None
+        return names[0]
+
+    def wait(self, scenes=None, timeout=10):
+        """
+        等待画面变为指定界面之一
+
+        :param scenes: 界面名称列表，为None时等待任意已知界面
+        :param timeout: 超时时间（秒），默认10秒
+        :return: 识别到的界面名称，超时返回None
+        """
+        def detect(frame):
+            name = self.classify(frame)
+            if name and (scenes is None or name in scenes):
+                return name
+            return None
+
+        return self.tools.wait_screen(detect, timeout) or None
+
+
+class SceneGuard(object):
+    """
+    步骤前置条件检查：等待目标时如果画面稳定停留在另一个已知界面，立即中止（或重新导航），不再等到超时
+    """
+
+    def __init__(self, classifier, expected, navigator=None, grace=1.5):
+        """
+        :param classifier: SceneClassifier
+        :param expected: 期望的界面名称列表
+        :param navigator: 传入时请求wait_screen导航回期望的第一个界面后继续等待（抛出Reroute），为None时抛出SceneError
+        :param grace: 同一个错误界面持续多久（秒）才处理，避免点击后旧画面还没切走时误判，默认1.5秒
+        """
+        self.classifier = classifier
+        self.expected = list(expected)
+        self.navigator = navigator
+        self.grace = grace
+        self._wrong = None
+        self._since = 0
+
+    @property
+    def pending(self):
+        """
+        :return: 是否已发现错误界面、正在等待确认
+        """
+        return self._wrong is not None
+
+    def __call__(self, frame):
+        """
+        检查一帧画面（由Tools.wait_screen在目标未出现时调用）
+
+        :param frame: 屏幕帧
+        :raises SceneError: 画面停留在其他已知界面且不重新导航时
+        :raises Reroute: 画面停留在其他已知界面且需要重新导航时
+        """
+        scene = self.classifier.classify(frame)
+        if scene is None or scene in self.expected:
+            self._wrong = None
+            return
+        now = time.time()
+        if scene != self._wrong:
+            self._wrong, self._since = scene, now
+            return
+        if now - self._since < self.grace:
+            return
+        self._wrong = None
+        if self.navigator is None:
+            raise SceneError(self.expected, scene)
+        target = self.expected[0]
+        raise Reroute(lambda timeout: self.navigator.goto(target, timeout=timeout),
+                      f"当前界面为 {scene}，重新前往 {target}")
+
+
+class Navigator(object):
+    """
+    界面导航：在声明式的界面图上按最短路径从当前界面走到目标界面，每走一步重新识别一次界面
+    """
+
+    def __init__(self, tools, classifier=None, edges=None):
+        """
+        :param tools: Tools实例
+        :param classifier: SceneClassifier，默认用tools新建
+        :param edges: 界面图的边列表，默认EDGES
+        """
+        self.tools = tools
+        self.classifier = classifier or SceneClassifier(tools)
+        self.edges = list(edges or EDGES)
+        self.current = None
+
+    def path(self, source, target):
+        """
+        广度优先搜索最短路径
+
+        :param source: 起点界面
+        :param target: 目标界面
+        :return: Edge列表（source与target相同时为空列表），不可达返回None
+        """
+        if source == target:
+            return list()
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for edge in self.edges:
+                if edge.source != node or edge.target in previous:
+                    continue
+                previous[edge.target] = edge
+                if edge.target == target:
+                    path = list()
+                    while edge is not None:
+                        path.append(edge)
+                        edge = previous[edge.source]
+                    return path[::-1]
+                queue.append(edge.target)
+        return None
+
+    def follow(self, edge, timeout=10):
+        """
+        执行一条边上的操作
+
+        :param edge: Edge
+        :param timeout: 每个操作等待目标出现的超时时间（秒），默认10秒
+        """
+        logger.debug(f"界面跳转: {edge.source} -> {edge.target}")
+        for action in edge.actions:
+            if action[0] == "txt":
+                self.tools.click_txt(action[1], timeout=timeout)
+            elif action[0] == "image":
+                threshold = action[2] if len(action) > 2 else 0.7
+                self.tools.click_image(action[1], timeout=timeout, threshold=threshold)
+            else:
+                raise ValueError(f"不支持的导航操作: {action}")
+
+    def goto(self, target, timeout=60, step_timeout=10):
+        """
+        从当前界面走到目标界面
+
+        :param target: 目标界面名称
+        :param timeout: 总超时时间（秒），默认60秒
+        :param step_timeout: 每一步等待界面出现的超时时间（秒），默认10秒
+        :return: 目标界面名称
+        :raises ValueError: 当前界面无法识别、目标不可达或超时
+        """
+        # 导航本身的点击不做界面检查
+        guard, self.tools.guard = self.tools.guard, None
+        try:
+            return self._goto(target, timeout, step_timeout)
+        finally:
+            self.tools.guard = guard
+
+    def _goto(self, target, timeout, step_timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            current = self.current = self.classifier.wait(timeout=min(step_timeout, max(deadline - time.time(), 0)))
+            if current == target:
+                return target
+            if current is None:
+                # 未知界面（弹窗、好友基地等）先尝试点主页按钮回到已知界面
+                if self.tools.click_image("home", timeout=1):
+                    continue
+                raise ValueError(f"无法识别当前界面，无法前往: {target}")
+            path = self.path(current, target)
+            if path is None:
+                raise ValueError(f"界面 {current} 无法到达 {target}")
+            self.follow(path[0], step_timeout)
+            self.classifier.wait([path[0].target], step_timeout)
+        raise ValueError(f"前往界面 {target} 超时")
+
+    @contextmanager
+    def expect(self, *scenes, reroute=False, grace=1.5):
+        """
+        声明一组步骤执行期间应处于的界面，等待目标时发现画面停留在其他已知界面会立即处理：
+
+            with navigator.expect("task"):
+                tools.click_txt("日常")
+
+        :param scenes: 期望的界面名称
+        :param reroute: 为True时导航回期望的界面后继续等待，为False时抛出SceneError
+        :param grace: 错误界面持续多久（秒）才处理，默认1.5秒
+        """
+        previous = self.tools.guard
+        self.tools.guard = SceneGuard(self.classifier, scenes, self if reroute else None, grace)
+        try:
+            yield
+        finally:
+            self.tools.guard = previous
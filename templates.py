@@ -0,0 +1,260 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import json
+import os
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+from loguru import logger
+
+PACK_MAGIC = b"MCTP"
+PACK_VERSION = 1
+# 资源包数据区对齐字节数
+PACK_ALIGN = 64
+# 饱和度超过COLORFUL_SATURATION的像素占比超过COLORFUL_RATIO时，认为模板颜色有区分度
+COLORFUL_SATURATION = 80
+COLORFUL_RATIO = 0.15
+
+
+class TemplateImage(object):
+    """
+    预处理好的模板图片：彩色图、灰度图以及灰度金字塔
+    """
+
+    def __init__(self, name, color, gray=None, pyramid=None, mtime=0):
+        """
+        :param name: 模板名称（不带扩展名）
+        :param color: 彩色模板（BGR）
+        :param gray: 灰度模板，为None时自动计算
+        :param pyramid: 灰度金字塔列表，第0层为原始灰度图，为None时自动计算
+        :param mtime: 模板文件的修改时间（纳秒），用于判断是否需要重新加载
+        """
+        self.name = name
+        self.color = color
+        self.gray = gray if gray is not None else cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+        self.pyramid = pyramid if pyramid is not None else build_pyramid(self.gray)
+        self.mtime = mtime
+        self._colorful = None
+
+    @property
+    def colorful(self):
+        """
+        :return: 模板颜色是否有区分度（高饱和度像素较多），颜色不明显的模板可以只用灰度匹配
+        """
+        if self._colorful is None:
+            hsv = cv2.cvtColor(np.ascontiguousarray(self.color), cv2.COLOR_BGR2HSV)
+            self._colorful = bool((hsv[:, :, 1] > COLORFUL_SATURATION).mean() > COLORFUL_RATIO)
+        return self._colorful
+
+    @property
+    def size(self):
+        """
+        :return: 模板尺寸（宽, 高）
+        """
+        return self.color.shape[1], self.color.shape[0]
+
+
+def build_pyramid(gray, levels=3, min_size=8):
+    """
+    构建灰度金字塔，每层缩小一半，最短边小于min_size时停止
+
+    :param gray: 灰度图
+    :param levels: 最多层数（包含原图），默认3
+    :param min_size: 最短边下限（像素），默认8
+    :return: 金字塔列表，第0层为原图
+    """
+    pyramid = [gray]
+    while len(pyramid) < levels and min(pyramid[-1].shape[:2]) // 2 >= min_size:
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+class TemplateLibrary(object):
+    """
+    模板图片库：启动时把images目录下的模板一次性加载到内存，模板文件变化时自动重新加载
+    """
+
+    def __init__(self, image_dir="images", pack_path=None, check_interval=1.0, exclude=("now",)):
+        """
+        初始化模板库
+
+        :param image_dir: 模板图片目录，默认images
+        :param pack_path: 预编译资源包路径（可选），存在且与图片一致时通过内存映射直接加载
+        :param check_interval: 检查模板文件是否变化的最小间隔（秒），默认1秒
+        :param exclude: 不作为模板加载的文件名（调试截图等）
+        """
+        self.image_dir = image_dir
+        self.pack_path = pack_path
+        self.check_interval = check_interval
+        self.exclude = set(exclude)
+        self._templates = dict()
+        self._checked = dict()
+        self._lock = threading.Lock()
+        self.load()
+
+    def path(self, name):
+        """
+        :param name: 模板名称（不带扩展名）
+        :return: 模板图片路径
+        """
+        return os.path.join(self.image_dir, f"{name}.png")
+
+    def names(self):
+        """
+        :return: 模板目录下所有模板名称
+        """
+        if not os.path.isdir(self.image_dir):
+            return list()
+        names = list()
+        for filename in sorted(os.listdir(self.image_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() == ".png" and name not in self.exclude:
+                names.append(name)
+        return names
+
+    def load(self):
+        """
+        加载全部模板，优先使用与图片一致的资源包
+        """
+        packed = dict()
+        if self.pack_path and os.path.exists(self.pack_path):
+            try:
+                packed = load_pack(self.pack_path)
+            except Exception as e:
+                logger.warning(f"模板资源包加载失败，改为读取图片: {e}")
+        with self._lock:
+            for name in self.names():
+                template = packed.get(name)
+                if template is None or template.mtime != self._mtime(name):
+                    template = self._read(name)
+                if template is not None:
+                    self._templates[name] = template
+                    self._checked[name] = time.time()
+        logger.debug(f"已加载模板: {list(self._templates)}")
+
+    def get(self, name):
+        """
+        获取模板，模板文件被修改时会自动重新加载
+
+        :param name: 模板名称（不带扩展名）
+        :return: TemplateImage
+        :raises ValueError: 模板图片不存在时抛出异常
+        """
+        with self._lock:
+            template = self._templates.get(name)
+            now = time.time()
+            if template is None or now - self._checked.get(name, 0) >= self.check_interval:
+                self._checked[name] = now
+                if template is None or template.mtime != self._mtime(name):
+                    reloaded = self._read(name)
+                    if reloaded is not None:
+                        if template is not None:
+                            logger.info(f"模板 {name} 已更新，重新加载")
+                        template = self._templates[name] = reloaded
+        if template is None:
+            raise ValueError(f"模板图片不存在: {self.path(name)}")
+        return template
+
+    def compile(self, pack_path=None):
+        """
+        把当前所有模板（彩色、灰度、金字塔）编译成一个资源包文件，供下次启动时内存映射加载
+
+        :param pack_path: 资源包路径，默认使用初始化时的pack_path
+        :return: 资源包路径
+        """
+        pack_path = pack_path or self.pack_path
+        if not pack_path:
+            raise ValueError("未指定资源包路径")
+        for name in self.names():
+            self.get(name)
+        with self._lock:
+            templates = list(self._templates.values())
+        save_pack(pack_path, templates)
+        logger.info(f"模板资源包已生成: {pack_path}")
+        return pack_path
+
+    def _mtime(self, name):
+        try:
+            return os.stat(self.path(name)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self, name):
+        mtime = self._mtime(name)
+        if mtime is None:
+            return None
+        color = cv2.imread(self.path(name))
+        if color is None:
+            logger.warning(f"模板图片读取失败: {self.path(name)}")
+            return None
+        return TemplateImage(name, color, mtime=mtime)
+
+
+def save_pack(pack_path, templates):
+    """
+    保存模板资源包
+
+    文件结构：魔数(4字节) + 版本(uint32) + 索引长度(uint64) + JSON索引 + 按PACK_ALIGN对齐的原始像素数据
+
+    :param pack_path: 资源包路径
+    :param templates: TemplateImage列表
+    """
+    index = dict()
+    blobs = list()
+    offset = 0
+    for template in templates:
+        arrays = [("color", template.color), ("gray", template.gray)]
+        arrays += [(f"pyramid{i}", level) for i, level in enumerate(template.pyramid[1:], 1)]
+        entry = {"mtime": template.mtime, "arrays": dict()}
+        for key, array in arrays:
+            array = np.ascontiguousarray(array, dtype=np.uint8)
+            entry["arrays"][key] = [offset, list(array.shape)]
+            blobs.append(array)
+            padding = -array.nbytes % PACK_ALIGN
+            if padding:
+                blobs.append(np.zeros(padding, dtype=np.uint8))
+            offset += array.nbytes + padding
+        index[template.name] = entry
+    header = json.dumps(index).encode("utf-8")
+    prefix = PACK_MAGIC + struct.pack("<IQ", PACK_VERSION, len(header)) + header
+    prefix += b"\0" * (-len(prefix) % PACK_ALIGN)
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix)
+        for blob in blobs:
+            f.write(blob.tobytes())
+    os.replace(tmp_path, pack_path)
+
+
+def load_pack(pack_path):
+    """
+    通过内存映射加载模板资源包
+
+    :param pack_path: 资源包路径
+    :return: {模板名称: TemplateImage}
+    """
+    with open(pack_path, "rb") as f:
+        magic, version, header_len = struct.unpack("<4sIQ", f.read(16))
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"不支持的模板资源包格式: {pack_path}")
+        index = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = 16 + header_len
+    data_start += -data_start % PACK_ALIGN
+    data = np.memmap(pack_path, dtype=np.uint8, mode="r", offset=data_start)
+    templates = dict()
+    for name, entry in index.items():
+        arrays = dict()
+        for key, (offset, shape) in entry["arrays"].items():
+            arrays[key] = data[offset:offset + int(np.prod(shape))].reshape(shape)
+        pyramid = [arrays["gray"]] + [arrays[f"pyramid{i}"] for i in range(1, len(arrays) - 1)]
+        templates[name] = TemplateImage(name, arrays["color"], arrays["gray"], pyramid, entry["mtime"])
+    return templates
+
+
+if __name__ == "__main__":
+    # 生成模板资源包：python templates.py
+    TemplateLibrary(pack_path="images/templates.pack").compile()
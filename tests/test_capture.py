@@ -0,0 +1,43 @@
+# -*- encoding=utf8 -*-
+import numpy as np
+import pytest
+
+from capture import AdbRawCapture
+from fake_adb import FakeAdbServer
+
+
+def make_frames(count=3, size=(72, 128)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size + (3,), dtype=np.uint8) for _ in range(count)]
+
+
+@pytest.mark.parametrize("header_size", [12, 16])
+def test_raw_capture_header_and_pixels(header_size):
+    frames = make_frames()
+    with FakeAdbServer(frames, header_size=header_size) as fake:
+        capture = AdbRawCapture(fake.serial, client=fake.client())
+        try:
+            # probe消耗第一帧，之后的截图按顺序循环
+            first = capture.grab()
+            assert capture.header_size == header_size
+            assert np.array_equal(first, frames[1])
+            assert np.array_equal(capture.grab(), frames[2])
+            assert np.array_equal(capture.grab(), frames[0])
+        finally:
+            capture.close()
+
+
+def test_raw_capture_reconnects_after_stream_dropped():
+    frames = make_frames()
+    with FakeAdbServer(frames) as fake:
+        capture = AdbRawCapture(fake.serial, client=fake.client())
+        try:
+            assert capture.grab() is not None
+            fake.drop_streams()
+            frame = capture.grab()
+            assert frame is not None
+            assert any(np.array_equal(frame, expected) for expected in frames)
+            streams = [request for request in fake.requests if request == f"exec:{AdbRawCapture.STREAM_COMMAND}"]
+            assert len(streams) == 2
+        finally:
+            capture.close()
@@ -0,0 +1,69 @@
+# -*- encoding=utf8 -*-
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from ocr_cache import PersistentOcrCache
+
+NOW_PNG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images", "now.png")
+RESULT = [[[[[10, 10], [60, 10], [60, 30], [10, 30]], ["480", 0.99]]]]
+
+
+@pytest.fixture
+def base():
+    image = cv2.imread(NOW_PNG)
+    assert image is not None
+    return image
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PersistentOcrCache("test", path=str(tmp_path / "ocr_cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def draw(image, text, origin=(400, 300), scale=0.5):
+    image = image.copy()
+    cv2.rectangle(image, (origin[0] - 4, origin[1] - 16), (origin[0] + 48, origin[1] + 6), (40, 40, 40), -1)
+    cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 1, cv2.LINE_AA)
+    return image
+
+
+def remember(cache, image, roi=None):
+    signature = cache.signature(image)
+    cache.put(signature, roi, RESULT)
+    cache.put(signature, roi, RESULT)
+
+
+def test_single_sighting_is_not_persisted(cache, base):
+    cache.put(cache.signature(base), None, RESULT)
+    assert len(cache) == 0
+    assert cache.get(cache.signature(base)) is None
+
+
+def test_repeated_screen_hits(cache, base):
+    remember(cache, base)
+    assert len(cache) == 1
+    assert cache.get(cache.signature(base)) == RESULT
+
+
+def test_noise_still_hits(cache, base):
+    remember(cache, base)
+    noise = np.random.RandomState(0).randint(-6, 7, base.shape)
+    noisy = np.clip(base.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    assert cache.get(cache.signature(noisy)) == RESULT
+
+
+def test_roi_is_cached_separately(cache, base):
+    remember(cache, base)
+    assert cache.get(cache.signature(base), (0, 0, base.shape[1], base.shape[0])) is None
+
+
+@pytest.mark.parametrize("before, after", [("1", "7"), ("480", "430"), ("53", "58"), ("35", "36")])
+def test_one_digit_change_misses(cache, base, before, after):
+    remember(cache, draw(base, before))
+    assert cache.get(cache.signature(draw(base, before))) == RESULT
+    assert cache.get(cache.signature(draw(base, after))) is None
@@ -0,0 +1,28 @@
+# -*- encoding=utf8 -*-
+
+from ocr_result import OcrBox, OcrResult
+
+# 任务页顶部的一行标签，外加一个不在同一行的文本框
+DAILY = OcrBox("日常", 100, 20, 140, 44, 0.99)
+WEEKLY = OcrBox("周常", 170, 22, 210, 46, 0.99)
+EVENT = OcrBox("活动", 300, 20, 340, 44, 0.99)
+REWARD = OcrBox("领取", 175, 200, 215, 224, 0.99)
+RESULT = OcrResult([DAILY, WEEKLY, EVENT, REWARD])
+
+
+def test_nearest_on_same_line():
+    assert RESULT.nearest_left(WEEKLY) is DAILY
+    assert RESULT.nearest_right(WEEKLY) is EVENT
+    assert RESULT.nearest_left(DAILY) is None
+    assert RESULT.nearest_right(EVENT) is None
+
+
+def test_nearest_max_distance():
+    assert RESULT.nearest_right(WEEKLY, max_distance=50) is None
+    assert RESULT.nearest_left(EVENT, max_distance=100) is WEEKLY
+    assert RESULT.nearest_left(EVENT, max_distance=50) is None
+
+
+def test_nearest_below():
+    assert RESULT.nearest_below(WEEKLY) is REWARD
+    assert RESULT.nearest_below(DAILY) is None
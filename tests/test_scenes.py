@@ -0,0 +1,76 @@
+# -*- encoding=utf8 -*-
+import os
+
+import cv2
+import pytest
+
+from scenes import Scene, SceneClassifier
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+
+# images/now.png（勘探指南首页，不是任何已定义的界面）上的文字
+NOW_TEXTS = ["勘探指南", "2025-05-07至2025-06-11", "倒计时:17天15时53分", "基础勘探生效中", "等级.35", "勘探等级",
+             "480/800", "升级", "任务", "等级", "基础勘探", "高级勘探", "升级到40级获得", "30000", "120k", "600"]
+
+
+class FakeTools(object):
+    """
+    按给定的文字和模板图片返回识别结果，帧本身就是(文字列表, 图片集合)
+    """
+    scene = None
+
+    def get_screen(self):
+        return None
+
+    def ocr_boxes(self, frame, roi=None):
+        return [(text, (0, 0), 1.0) for text in frame[0]]
+
+    def match_images(self, images, threshold=0.7, frame=None):
+        return [name for name in images if name in frame[1]]
+
+
+@pytest.mark.parametrize("texts, images, expected", [
+    (["出击", "基地", "任务"], set(), "home"),
+    (["出击", "模拟军演"], set(), "sortie"),
+    # 演习界面标题仍显示"模拟军演"
+    (["模拟军演", "镜像竞技"], set(), "drill"),
+    (["模拟军演", "镜像竞技", "战力 12345", "战力 23456"], {"refresh"}, "arena"),
+    (["合成工厂"], {"trade"}, "base"),
+    # 基地里打开的订单界面
+    (["合成工厂", "构建订单", "选择好友"], {"trade"}, "trade"),
+    (["合成工厂", "基地素材", "稀有黑匣"], set(), "factory"),
+    (NOW_TEXTS, set(), None),
+    ([], set(), None),
+])
+def test_classify(texts, images, expected):
+    tools = FakeTools()
+    assert SceneClassifier(tools).classify((texts, images)) == expected
+    assert tools.scene == expected
+
+
+def test_tie_is_unknown():
+    classifier = SceneClassifier(FakeTools(), [Scene("a", texts=["确定"]), Scene("b", texts=["确定"])])
+    assert classifier.classify((["确定"], set())) is None
+
+
+def test_classify_reference_frame():
+    # 真实截图需要PaddleOCR识别
+    pytest.importorskip("paddleocr")
+    from ocr_engine import get_registry
+    frame = cv2.imread(os.path.join(IMAGES_DIR, "now.png"))
+    ocr = get_registry().acquire()
+    try:
+        texts = [word_info[1][0] for line in ocr.ocr(frame, cls=True) or list() for word_info in line or list()]
+    finally:
+        get_registry().release(ocr)
+    assert "勘探指南" in texts
+    assert SceneClassifier(FakeTools()).classify((texts, set())) is None
+
+
+def test_unknown_keeps_last_scene():
+    tools = FakeTools()
+    classifier = SceneClassifier(tools)
+    assert classifier.classify((["出击", "基地", "任务"], set())) == "home"
+    # 过渡画面无法识别，沿用上一次的界面
+    assert classifier.classify(([], set())) is None
+    assert tools.scene == "home"
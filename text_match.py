@@ -0,0 +1,71 @@
+# -*- encoding=utf8 -*-
+__author__ = "x"
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Indel
+
+
+def score_matrix(targets, texts, min_ratio=0.0):
+    """
+    一次性计算所有目标文本与所有识别文本的相似度矩阵
+
+    相似度与Levenshtein.ratio一致（Indel归一化相似度），长度相差过大或没有公共字符、
+    不可能得分的组合会先被跳过。
+
+    :param targets: 目标文本列表
+    :param texts: 识别出的文本列表
+    :param min_ratio: 只关心不低于该值的相似度，上限达不到的文本不计算（记为0）
+    :return: numpy数组，形状(len(targets), len(texts))，取值0-1
+    """
+    scores = np.zeros((len(targets), len(texts)), dtype=np.float32)
+    if not targets or not texts:
+        return scores
+    # 长度预筛：相似度上限为 2*min(a,b)/(a+b)
+    target_len = np.array([len(t) for t in targets], dtype=np.float32)[:, None]
+    text_len = np.array([len(t) for t in texts], dtype=np.float32)[None, :]
+    upper = 2 * np.minimum(target_len, text_len) / np.maximum(target_len + text_len, 1)
+    # 字符集预筛：和任何目标都没有公共字符的文本直接跳过
+    charset = set("".join(targets))
+    candidates = [i for i, text in enumerate(texts) if upper[:, i].max() >= min_ratio and not charset.isdisjoint(text)]
+    if not candidates:
+        return scores
+    scores[:, candidates] = process.cdist(targets, [texts[i] for i in candidates],
+                                          scorer=Indel.normalized_similarity, dtype=np.float32)
+    return scores
+
+
+def best_matches(targets, texts, ratio=0.7):
+    """
+    为每个目标文本找出相似度最高的识别文本
+
+    :param targets: 目标文本列表
+    :param texts: 识别出的文本列表
+    :param ratio: 相似度阈值（0-1），也可以是与targets等长的阈值列表
+    :return: 与targets等长的列表，元素为(文本下标, 相似度)，低于阈值的目标为None
+    """
+    if not texts:
+        return [None] * len(targets)
+    ratios = np.broadcast_to(np.asarray(ratio, dtype=np.float32), (len(targets),))
+    scores = score_matrix(targets, texts, float(ratios.min()) if len(ratios) else 0.0)
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(targets)), best]
+    return [(int(i), float(score)) if score >= r else None
+            for i, score, r in zip(best, best_scores, ratios)]
+
+
+def parse_target(target):
+    """
+    解析目标文本描述
+
+    :param target: 文本（精确匹配）或元组(文本, 匹配方式[, 相似度阈值])，匹配方式为txt、ocr或le
+    :return: (目标文本, 匹配方式, 相似度阈值)
+    """
+    if isinstance(target, str):
+        target = (target,)
+    target_text = target[0]
+    mode = target[1] if len(target) > 1 else "txt"
+    ratio = target[2] if len(target) > 2 else 0.7
+    if mode not in ("txt", "ocr", "le"):
+        raise ValueError(f"不支持的匹配方式: {mode}")
+    return target_text, mode, ratio